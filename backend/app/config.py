@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 SOURCES_DIR = Path("./sources")
@@ -5,8 +6,88 @@ MEDIA_DIR = Path("./media")
 DATA_DIR = Path("./data")
 DB_PATH = DATA_DIR / "kalinsky.db"
 PREVIEWS_DIR = MEDIA_DIR / "previews"
+PROXIES_DIR = MEDIA_DIR / "proxies"
+THUMBNAILS_DIR = MEDIA_DIR / "thumbnails"
+WAVEFORMS_DIR = MEDIA_DIR / "waveforms"
 FFMPEG_BIN = "ffmpeg"
 FFPROBE_BIN = "ffprobe"
 AUDIO_FADE_MS = 50
 AUDIO_CODEC = "aac"
 AUDIO_BITRATE = "128k"
+# Release audio: "encode" re-encodes all of it, "splice" copies it and re-encodes only the fade
+# windows, "copy" copies all of it without fades
+RELEASE_AUDIO = os.environ.get("RELEASE_AUDIO", "encode")
+FFMPEG_WORKERS = int(os.environ.get("FFMPEG_WORKERS", 0)) or os.cpu_count() or 1
+# Encoder threads shared out between the ffmpeg encodes running at any moment
+FFMPEG_THREADS = int(os.environ.get("FFMPEG_THREADS", 0)) or os.cpu_count() or 1
+# Preview encodes, picked per assembly. "threads" caps the process (0: as many as the budget allows),
+# "height" is the output height; the filtergraph engine letterboxes to 16:9 at that height.
+ENCODER_PROFILES = {
+    "fast": {
+        "codec": "libx264", "preset": "ultrafast", "crf": 28, "threads": 0, "height": 720,
+        "audio_codec": AUDIO_CODEC, "audio_bitrate": AUDIO_BITRATE,
+    },
+    "balanced": {
+        "codec": "libx264", "preset": "veryfast", "crf": 23, "threads": 0, "height": 720,
+        "audio_codec": AUDIO_CODEC, "audio_bitrate": AUDIO_BITRATE,
+    },
+    "draft": {
+        "codec": "libx264", "preset": "ultrafast", "crf": 32, "threads": 2, "height": 360,
+        "audio_codec": AUDIO_CODEC, "audio_bitrate": "96k",
+    },
+    "hevc": {
+        "codec": "libx265", "preset": "fast", "crf": 28, "threads": 0, "height": 720,
+        "audio_codec": AUDIO_CODEC, "audio_bitrate": AUDIO_BITRATE,
+    },
+}
+DEFAULT_ENCODER_PROFILE = os.environ.get("ENCODER_PROFILE", "fast")
+# Preview-sized, short-GOP copies of sources that previews cut from instead of the originals.
+# Built in the background after reindex; PROXIES=0 turns them off.
+PROXIES = os.environ.get("PROXIES", "1") != "0"
+# Tall enough for every preview profile by default; a profile taller than this cuts from the original
+PROXY_HEIGHT = int(os.environ.get("PROXY_HEIGHT", 0)) or max(p["height"] for p in ENCODER_PROFILES.values())
+PROXY_WORKERS = int(os.environ.get("PROXY_WORKERS", 1))
+# Proxy builds stay out of the FFMPEG_THREADS budget, so previews never wait on one for threads;
+# instead each is capped at this many and runs at a lower CPU priority
+PROXY_THREADS = int(os.environ.get("PROXY_THREADS", 2))
+# Scrubbing thumbnails: one every SPRITE_INTERVAL seconds, spread wider on long sources
+SPRITE_INTERVAL = 2.0
+SPRITE_MAX_THUMBS = 600
+SPRITE_THUMB_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+# Waveforms: mono PCM at this rate, finest level one peak/RMS pair per bucket (10 ms)
+WAVEFORM_SAMPLE_RATE = 8000
+WAVEFORM_BUCKET_SAMPLES = 80
+SILENCE_THRESHOLD_DB = -40.0
+SILENCE_SNAP_WINDOW = 0.5
+# Reindex on changes in SOURCES_DIR; WATCH_POLLING=1 where inotify doesn't see them (e.g. Docker Desktop bind mounts)
+WATCH_SOURCES = os.environ.get("WATCH_SOURCES", "1") != "0"
+WATCH_POLLING = os.environ.get("WATCH_POLLING", "0") == "1"
+WATCH_DEBOUNCE = 1.0
+# A changed file is indexed once its size has held still this long, i.e. the copy has finished
+SOURCE_STABLE_SECONDS = 2.0
+SEGMENT_CACHE_DIR = MEDIA_DIR / "cache"
+SEGMENT_CACHE_MAX_BYTES = int(os.environ.get("SEGMENT_CACHE_MAX_BYTES", 20 * 1024**3))
+# Storage: drop segments/ and the concat list once result.mp4 exists (KEEP_INTERMEDIATES=1 to keep them)
+KEEP_INTERMEDIATES = os.environ.get("KEEP_INTERMEDIATES", "0") == "1"
+# Finished previews older than this many days are deleted; 0 keeps them
+PREVIEW_TTL_DAYS = float(os.environ.get("PREVIEW_TTL_DAYS", 0))
+# Oldest finished previews are evicted while media/ is above this; 0 for no quota
+MEDIA_QUOTA_BYTES = int(os.environ.get("MEDIA_QUOTA_BYTES", 0))
+# Queued assemblies wait (after evicting previews) while the media volume has less free space than this
+MIN_FREE_BYTES = int(os.environ.get("MIN_FREE_BYTES", 2 * 1024**3))
+STORAGE_GC_INTERVAL = 600.0
+DB_READERS = int(os.environ.get("DB_READERS", 4))
+MAX_CONCURRENT_ASSEMBLIES = int(os.environ.get("MAX_CONCURRENT_ASSEMBLIES", 2))
+# Which kind jumps the queue: "release" or "preview"
+ASSEMBLY_PRIORITY = os.environ.get("ASSEMBLY_PRIORITY", "release")
+# Jobs interrupted by a restart are re-queued until they have been started this many times
+MAX_JOB_ATTEMPTS = 2
+# Set to 0 on the API when separate `python -m app.worker` processes do the rendering
+EMBEDDED_WORKER = os.environ.get("EMBEDDED_WORKER", "1") != "0"
+WORKER_HEARTBEAT_INTERVAL = 10.0
+# Running jobs whose worker hasn't heartbeated for this long are re-queued
+WORKER_TIMEOUT = 60.0
+# Render workers serve their /metrics on this port when set (the API serves its own)
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", 0))
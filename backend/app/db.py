@@ -1,6 +1,11 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import aiosqlite
 
-from app.config import DATA_DIR, DB_PATH
+from app.config import DATA_DIR, DB_PATH, DB_READERS
 
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS sources (
@@ -10,19 +15,43 @@ CREATE TABLE IF NOT EXISTS sources (
     duration REAL NOT NULL,
     resolution TEXT NOT NULL,
     codec TEXT NOT NULL,
-    file_size INTEGER NOT NULL
+    file_size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL DEFAULT 0
 );
 
+CREATE UNIQUE INDEX IF NOT EXISTS sources_filename ON sources(filename);
+
 CREATE TABLE IF NOT EXISTS assemblies (
     id TEXT PRIMARY KEY,
     name TEXT,
     status TEXT NOT NULL,
     error TEXT,
     preview INTEGER NOT NULL DEFAULT 1,
+    engine TEXT NOT NULL DEFAULT 'segments',
+    release_mode TEXT NOT NULL DEFAULT 'copy',
+    profile TEXT NOT NULL DEFAULT 'fast',
     output_url TEXT,
+    stream_url TEXT,
+    signature TEXT,
     duration REAL,
     note TEXT,
-    created TEXT NOT NULL
+    created TEXT NOT NULL,
+    progress REAL,
+    fps REAL,
+    speed REAL,
+    eta REAL,
+    updated REAL
+);
+
+-- Keyframe/packet positions per source as packed arrays; stale once size/mtime_ns differ from the file
+CREATE TABLE IF NOT EXISTS packet_index (
+    filename TEXT PRIMARY KEY,
+    file_size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    keyframes BLOB NOT NULL,
+    offsets BLOB NOT NULL,
+    gop_sizes BLOB NOT NULL,
+    audio BLOB NOT NULL
 );
 
 CREATE TABLE IF NOT EXISTS tags (
@@ -47,12 +76,47 @@ CREATE TABLE IF NOT EXISTS clips (
     duration REAL NOT NULL,
     FOREIGN KEY (assembly_id) REFERENCES assemblies(id)
 );
+
+CREATE TABLE IF NOT EXISTS jobs (
+    assembly_id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat REAL,
+    enqueued REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs(state, priority DESC, enqueued);
+CREATE INDEX IF NOT EXISTS clips_assembly_pos ON clips(assembly_id, pos);
+CREATE INDEX IF NOT EXISTS assemblies_created ON assemblies(created, id);
 """
 
 
 MIGRATIONS = [
     "ALTER TABLE assemblies ADD COLUMN note TEXT",
     "ALTER TABLE tags ADD COLUMN color TEXT NOT NULL DEFAULT '#839496'",
+    "ALTER TABLE sources ADD COLUMN mtime_ns INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE assemblies ADD COLUMN progress REAL",
+    "ALTER TABLE assemblies ADD COLUMN fps REAL",
+    "ALTER TABLE assemblies ADD COLUMN speed REAL",
+    "ALTER TABLE assemblies ADD COLUMN eta REAL",
+    "ALTER TABLE assemblies ADD COLUMN updated REAL",
+    # Change feed for relaying updates made by out-of-process workers
+    """CREATE TRIGGER IF NOT EXISTS assemblies_touch_insert AFTER INSERT ON assemblies BEGIN
+           UPDATE assemblies SET updated = (julianday('now') - 2440587.5) * 86400.0 WHERE id = NEW.id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS assemblies_touch_update
+       AFTER UPDATE OF status, error, output_url, duration, note, progress, fps, speed, eta ON assemblies BEGIN
+           UPDATE assemblies SET updated = (julianday('now') - 2440587.5) * 86400.0 WHERE id = NEW.id;
+       END""",
+    "CREATE INDEX IF NOT EXISTS assemblies_updated ON assemblies(updated)",
+    "ALTER TABLE assemblies ADD COLUMN engine TEXT NOT NULL DEFAULT 'segments'",
+    "ALTER TABLE assemblies ADD COLUMN release_mode TEXT NOT NULL DEFAULT 'copy'",
+    "ALTER TABLE assemblies ADD COLUMN profile TEXT NOT NULL DEFAULT 'fast'",
+    "ALTER TABLE assemblies ADD COLUMN stream_url TEXT",
+    "ALTER TABLE assemblies ADD COLUMN signature TEXT",
+    "CREATE INDEX IF NOT EXISTS assemblies_signature ON assemblies(signature, created)",
 ]
 
 
@@ -68,10 +132,83 @@ async def init_db() -> None:
         await db.commit()
 
 
-async def get_db() -> aiosqlite.Connection:
-    db = await aiosqlite.connect(DB_PATH)
-    db.row_factory = aiosqlite.Row
-    return db
+PRAGMAS = """
+PRAGMA busy_timeout = 5000;
+PRAGMA synchronous = NORMAL;
+PRAGMA cache_size = -16000;
+PRAGMA mmap_size = 268435456;
+"""
+
+
+class ConnectionPool:
+    """Long-lived connections: one serialized writer and a set of readers.
+
+    In WAL mode readers see the last committed snapshot and never wait on the
+    writer, so status updates from running assemblies don't stall listings.
+    """
+
+    def __init__(self, path, readers: int):
+        self.path = path
+        self.size = readers
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._metrics = {"reads": 0, "writes": 0, "read_wait_s": 0.0, "write_wait_s": 0.0}
+
+    async def _connect(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self.path)
+        db.row_factory = aiosqlite.Row
+        await db.executescript(PRAGMAS)
+        return db
+
+    async def open(self) -> None:
+        self._writer = await self._connect()
+        await self._writer.executescript("PRAGMA journal_mode = WAL;")
+        for _ in range(self.size):
+            self._readers.put_nowait(await self._connect())
+
+    async def close(self) -> None:
+        while not self._readers.empty():
+            await self._readers.get_nowait().close()
+        if self._writer:
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        t0 = time.perf_counter()
+        db = await self._readers.get()
+        self._metrics["reads"] += 1
+        self._metrics["read_wait_s"] += time.perf_counter() - t0
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Exclusive writer connection; commits on success, rolls back on error."""
+        t0 = time.perf_counter()
+        async with self._write_lock:
+            self._metrics["writes"] += 1
+            self._metrics["write_wait_s"] += time.perf_counter() - t0
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+
+    def stats(self) -> dict:
+        return {
+            "readers": self.size,
+            "readers_idle": self._readers.qsize(),
+            "writer_busy": self._write_lock.locked(),
+            **self._metrics,
+        }
+
+
+pool = ConnectionPool(DB_PATH, DB_READERS)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,33 @@
+import asyncio
+
+# In-process pub/sub feeding the assembly event stream
+_subscribers: set[asyncio.Queue] = set()
+
+QUEUE_SIZE = 256
+
+
+def subscribe() -> asyncio.Queue:
+    q: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    _subscribers.add(q)
+    return q
+
+
+def unsubscribe(q: asyncio.Queue) -> None:
+    _subscribers.discard(q)
+
+
+def is_subscribed(q: asyncio.Queue) -> bool:
+    return q in _subscribers
+
+
+def has_subscribers() -> bool:
+    return bool(_subscribers)
+
+
+def publish(event: str, data: dict) -> None:
+    for q in list(_subscribers):
+        try:
+            q.put_nowait((event, data))
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop it, the client reconnects and resyncs
+            _subscribers.discard(q)
@@ -1,12 +1,20 @@
+import asyncio
+import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.config import DATA_DIR, MEDIA_DIR, SOURCES_DIR
-from app.db import init_db
-from app.routers import assemblies, sources, tags
+from app.config import DATA_DIR, EMBEDDED_WORKER, MEDIA_DIR, SOURCES_DIR, WATCH_SOURCES
+from app.db import init_db, pool
+from app.metrics import HTTP_SECONDS
+from app.routers import assemblies, metrics, sources, system, tags
+from app.services.catalog import catalog
+from app.services.relay import relay_worker_updates
+from app.services.scheduler import scheduler
+from app.services.storage import run_storage_gc
+from app.services.watcher import watch_sources
 
 
 @asynccontextmanager
@@ -15,7 +23,26 @@ async def lifespan(app: FastAPI):
     MEDIA_DIR.mkdir(parents=True, exist_ok=True)
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     await init_db()
+    await pool.open()
+    await catalog.get()
+    # One collector for the whole deployment, whether or not this process renders
+    gc = asyncio.create_task(run_storage_gc())
+    stop_watching = asyncio.Event()
+    watcher = asyncio.create_task(watch_sources(stop_watching)) if WATCH_SOURCES else None
+    if EMBEDDED_WORKER:
+        await scheduler.start()
+    else:
+        relay = asyncio.create_task(relay_worker_updates())
     yield
+    if EMBEDDED_WORKER:
+        await scheduler.stop()
+    else:
+        relay.cancel()
+    gc.cancel()
+    if watcher:
+        stop_watching.set()
+        await asyncio.gather(watcher, return_exceptions=True)
+    await pool.close()
 
 
 app = FastAPI(title="Kalinsky API", version="0.1.0", lifespan=lifespan)
@@ -27,9 +54,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, to keep the series count bounded
+    route = request.scope.get("route")
+    if route is not None:
+        HTTP_SECONDS.observe(
+            time.perf_counter() - t0, method=request.method, route=route.path, status=response.status_code
+        )
+    return response
+
+
 app.include_router(sources.router)
 app.include_router(assemblies.router)
 app.include_router(tags.router)
+app.include_router(system.router)
+app.include_router(metrics.router)
 
+# nginx serves both directly in the compose setup; these mounts are for running the API on its own
 app.mount("/media", StaticFiles(directory=str(MEDIA_DIR)), name="media")
 app.mount("/sources", StaticFiles(directory=str(SOURCES_DIR)), name="sources")
@@ -0,0 +1,140 @@
+"""Process-local metrics rendered in the Prometheus text exposition format."""
+import bisect
+import functools
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values: dict[tuple[str, ...], object] = {}
+        if not labels and self.kind != "histogram":
+            self._values[()] = 0
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._values.items()):
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key: tuple[str, ...], value) -> list[str]:
+        return [f"{self.name}{_labels(self.label_names, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def clear(self) -> None:
+        self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _samples(self, key: tuple[str, ...], value) -> list[str]:
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip([*self.buckets, "+Inf"], counts):
+            cumulative += count
+            le = _labels(self.label_names, key, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+HTTP_SECONDS = Histogram(
+    "kalinsky_http_request_duration_seconds", "Time to the response headers, by route.",
+    ("method", "route", "status"),
+)
+DB_SECONDS = Histogram("kalinsky_db_query_duration_seconds", "Time spent in each state function.", ("query",))
+DB_ERRORS = Counter("kalinsky_db_errors_total", "state functions that raised.", ("query",))
+FFMPEG_SECONDS = Histogram(
+    "kalinsky_ffmpeg_duration_seconds", "Wall time of ffmpeg/ffprobe work.", ("op", "mode", "codec"),
+)
+FFMPEG_RUNNING = Gauge("kalinsky_ffmpeg_processes", "ffmpeg processes currently running.")
+FFMPEG_FAILURES = Counter("kalinsky_ffmpeg_failures_total", "ffmpeg runs that exited non-zero.", ("what",))
+ASSEMBLIES = Gauge("kalinsky_assemblies", "Assemblies by status, sampled at scrape time.", ("status",))
+ASSEMBLY_SECONDS = Histogram(
+    "kalinsky_assembly_duration_seconds", "Render time of finished assemblies.", ("mode", "engine", "status"),
+)
+ASSEMBLY_FAILURES = Counter("kalinsky_assembly_failures_total", "Assemblies that ended failed.", ("mode",))
+
+
+def timed_query(fn: Callable) -> Callable:
+    """Record the duration (and failures) of an async state function under its name."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with DB_SECONDS.time(query=fn.__name__):
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                DB_ERRORS.inc(query=fn.__name__)
+                raise
+    return wrapper
@@ -1,5 +1,16 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
+from app.config import DEFAULT_ENCODER_PROFILE
+
+# "segments": cut each clip to its own file, then concat-demux them.
+# "filtergraph": one ffmpeg run with a concat filter (previews only).
+Engine = Literal["segments", "filtergraph"]
+# "copy": stream-copy video from the keyframe before start (fast, may start early).
+# "smart": stream-copy whole GOPs, re-encode only the partial GOPs at each cut.
+ReleaseMode = Literal["copy", "smart"]
+
 
 class ClipInput(BaseModel):
     source: int | str
@@ -11,6 +22,10 @@ class AssemblyCreate(BaseModel):
     name: str | None = None
     clips: list[ClipInput]
     preview: bool = True
+    engine: Engine = "segments"
+    release_mode: ReleaseMode = "copy"
+    # Key of config.ENCODER_PROFILES for preview encodes; the configured default when omitted
+    profile: str | None = None
 
 
 class ClipDetail(BaseModel):
@@ -28,11 +43,28 @@ class AssemblyUpdate(BaseModel):
 class Assembly(BaseModel):
     id: str
     name: str | None = None
-    status: str = "processing"
+    status: str = "queued"
     error: str | None = None
     preview: bool = True
+    engine: Engine = "segments"
+    release_mode: ReleaseMode = "copy"
+    profile: str = DEFAULT_ENCODER_PROFILE
     clips: list[ClipDetail] = []
     output_url: str | None = None
+    # HLS playlist of a preview, playable while it is still rendering
+    stream_url: str | None = None
+    # Hash of everything that determines the output; identical batch submissions share one assembly
+    signature: str | None = None
     duration: float | None = None
     note: str | None = None
     created: str
+    progress: float | None = None
+    fps: float | None = None
+    speed: float | None = None
+    eta: float | None = None
+
+
+class BatchEntry(BaseModel):
+    assembly: Assembly
+    # An identical assembly already existed (finished or still rendering) and is returned instead
+    reused: bool = False
@@ -6,6 +6,17 @@ class SourceTag(BaseModel):
     color: str
 
 
+class CutPlan(BaseModel):
+    start: float
+    end: float
+    copy_start: float | None
+    copy_end: float | None
+    copy_seconds: float
+    copy_bytes: int
+    reencode_seconds: float
+    reencode_frames: int | None
+
+
 class Source(BaseModel):
     index: int
     filename: str
@@ -1,32 +1,56 @@
 import asyncio
+import base64
+import binascii
+import json
 from datetime import datetime, timezone
+from pathlib import Path
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 
-from app import state
-from app.models.assembly import Assembly, AssemblyCreate, AssemblyUpdate, ClipDetail
+from app import events, state
+from app.config import DEFAULT_ENCODER_PROFILE, ENCODER_PROFILES, MEDIA_DIR
+from app.models.assembly import Assembly, AssemblyCreate, AssemblyUpdate, BatchEntry, ClipDetail
 from app.models.source import Source
-from app.services.assembly import run_assembly
+from app.services.assembly import assembly_signature
+from app.services.catalog import CatalogSnapshot, catalog
+from app.services.scheduler import scheduler
+from app.services.storage import remove_assembly_media
 
 router = APIRouter(prefix="/api/v1/assemblies", tags=["assemblies"])
 
 
-def _resolve_source(ref: int | str, sources: list[Source]) -> Source:
-    for s in sources:
-        if isinstance(ref, int) and s.index == ref:
-            return s
-        if isinstance(ref, str) and s.filename == ref:
-            return s
-    raise HTTPException(status_code=422, detail=f"Source {ref!r} not found")
+def _resolve_source(ref: int | str, sources: CatalogSnapshot) -> Source:
+    src = sources.by_index.get(ref) if isinstance(ref, int) else sources.by_filename.get(ref)
+    if src is None:
+        raise HTTPException(status_code=422, detail=f"Source {ref!r} not found")
+    return src
 
 
-@router.post("", response_model=Assembly, status_code=202)
-async def create_assembly(body: AssemblyCreate):
-    sources = await state.get_sources()
-    if not sources:
-        raise HTTPException(status_code=409, detail="No index. Call POST /sources/reindex first.")
+def _encode_cursor(asm: Assembly) -> str:
+    return base64.urlsafe_b64encode(f"{asm.created},{asm.id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    # The cursor is the (created, id) key itself, so it stays valid if that assembly is deleted meanwhile
+    try:
+        created, _, asm_id = base64.urlsafe_b64decode(cursor.encode()).decode().rpartition(",")
+    except (binascii.Error, UnicodeDecodeError):
+        created = asm_id = ""
+    if not created or not asm_id:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+    return created, asm_id
+
+
+def _build_assembly(body: AssemblyCreate, sources: CatalogSnapshot) -> Assembly:
+    """Validate a submission against the sources and resolve it into an unnumbered, queued assembly."""
     if not body.clips:
         raise HTTPException(status_code=422, detail="Empty clips list")
+    if body.engine == "filtergraph" and not body.preview:
+        raise HTTPException(status_code=422, detail="The filtergraph engine only renders previews")
+    profile = body.profile or DEFAULT_ENCODER_PROFILE
+    if profile not in ENCODER_PROFILES:
+        raise HTTPException(status_code=422, detail=f"Unknown encoder profile {profile!r}")
 
     clips: list[ClipDetail] = []
     for i, c in enumerate(body.clips, 1):
@@ -40,24 +64,116 @@ async def create_assembly(body: AssemblyCreate):
             raise HTTPException(status_code=422, detail=f"start/end exceeds duration for clip {i}")
         clips.append(ClipDetail(pos=i, filename=src.filename, start=start, end=end, duration=end - start))
 
-    asm_id = await state.next_assembly_id()
     asm = Assembly(
-        id=asm_id,
+        id="",
         name=body.name,
-        status="processing",
+        status="queued",
         preview=body.preview,
+        engine=body.engine,
+        release_mode=body.release_mode,
+        profile=profile,
         clips=clips,
         created=datetime.now(timezone.utc).isoformat(),
     )
-    await state.save_assembly(asm)
-    task = asyncio.create_task(run_assembly(asm))
-    state.assembly_tasks[asm_id] = task
+    try:
+        asm.signature = assembly_signature(asm)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=409, detail=f"{Path(e.filename).name} is gone. Reindex sources.") from None
     return asm
 
 
+async def _source_snapshot() -> CatalogSnapshot:
+    sources = await catalog.get()
+    if not sources.sources:
+        raise HTTPException(status_code=409, detail="No index. Call POST /sources/reindex first.")
+    return sources
+
+
+@router.post("", response_model=Assembly, status_code=202)
+async def create_assembly(body: AssemblyCreate):
+    asm = _build_assembly(body, await _source_snapshot())
+    await scheduler.enqueue([asm])
+    events.publish("assembly", asm.model_dump())
+    return asm
+
+
+@router.post("/batch", response_model=list[BatchEntry], status_code=202)
+async def create_assemblies(bodies: list[AssemblyCreate]):
+    """Queue many assemblies at once, all validated before any is saved.
+
+    A submission identical to a finished, queued or rendering assembly (or to an
+    earlier one in the same batch) gets that assembly back instead of a new render.
+    """
+    sources = await _source_snapshot()
+    built = []
+    for i, body in enumerate(bodies, 1):
+        try:
+            built.append(_build_assembly(body, sources))
+        except HTTPException as e:
+            raise HTTPException(status_code=e.status_code, detail=f"Assembly {i}: {e.detail}") from None
+
+    existing = await state.assemblies_by_signature(list({asm.signature for asm in built}))
+    # A finished result is only worth reusing while its file is still there
+    existing = {
+        sig: asm for sig, asm in existing.items()
+        if asm.status != "done" or (MEDIA_DIR / asm.id / "result.mp4").exists()
+    }
+    entries, new, seen = [], [], {}
+    for asm in built:
+        if asm.signature in existing:
+            entries.append(BatchEntry(assembly=existing[asm.signature], reused=True))
+        elif asm.signature in seen:
+            entries.append(BatchEntry(assembly=seen[asm.signature], reused=True))
+        else:
+            seen[asm.signature] = asm
+            new.append(asm)
+            entries.append(BatchEntry(assembly=asm))
+    if new:
+        await scheduler.enqueue(new)
+        for asm in new:
+            events.publish("assembly", asm.model_dump())
+    return entries
+
+
 @router.get("", response_model=list[Assembly])
-async def list_assemblies():
-    return await state.list_assemblies()
+async def list_assemblies(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    before: str | None = None,
+    status: str | None = None,
+    preview: bool | None = None,
+    clips: bool = True,
+):
+    result = await state.list_assemblies(
+        limit=limit, before=_decode_cursor(before) if before is not None else None,
+        status=status, preview=preview, include_clips=clips,
+    )
+    if len(result) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(result[-1])
+    return result
+
+
+@router.get("/events")
+async def assembly_events():
+    """Server-Sent Events: ``assembly`` (full object), ``progress``, ``deleted`` and ``sources`` (after a reindex)."""
+    async def stream():
+        q = events.subscribe()
+        try:
+            yield "retry: 2000\n\n"
+            while events.is_subscribed(q):
+                try:
+                    name, data = await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {name}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            events.unsubscribe(q)
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{assembly_id}", response_model=Assembly)
@@ -73,7 +189,9 @@ async def update_assembly(assembly_id: str, body: AssemblyUpdate):
     updated = await state.update_assembly_note(assembly_id, body.note)
     if not updated:
         raise HTTPException(status_code=404, detail="Assembly not found")
-    return await state.get_assembly(assembly_id)
+    asm = await state.get_assembly(assembly_id)
+    events.publish("assembly", asm.model_dump())
+    return asm
 
 
 @router.delete("/{assembly_id}", status_code=204)
@@ -81,6 +199,10 @@ async def delete_assembly(assembly_id: str):
     deleted = await state.delete_assembly(assembly_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Assembly not found")
+    events.publish("deleted", {"id": assembly_id})
     task = state.assembly_tasks.pop(assembly_id, None)
     if task and not task.done():
         task.cancel()
+        # Let ffmpeg be killed before its output directory goes; leftovers are caught by the storage GC
+        await asyncio.wait([task], timeout=5)
+    await asyncio.to_thread(remove_assembly_media, assembly_id)
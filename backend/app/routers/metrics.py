@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app import metrics, state
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    metrics.ASSEMBLIES.clear()
+    for status, count in (await state.count_assemblies()).items():
+        metrics.ASSEMBLIES.set(count, status=status)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
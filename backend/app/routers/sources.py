@@ -1,78 +1,93 @@
-import asyncio
-import math
-
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
 from pydantic import BaseModel
 
-from app import state
-from app.config import FFMPEG_BIN, PREVIEWS_DIR, SOURCES_DIR
-from app.models.source import Source
-from app.services.probe import probe_video
+from app import events, state
+from app.models.source import CutPlan, Source
+from app.services.catalog import catalog
+from app.services.indexer import reindex_sources
+from app.services.packet_index import SnapMode, get_packet_index
+from app.services.thumbnails import get_thumbnails
+from app.services.waveform import get_waveform
 
 router = APIRouter(prefix="/api/v1/sources", tags=["sources"])
 
-EXTENSIONS = {".mp4", ".mov", ".mkv", ".webm"}
-
-
-async def generate_thumbnail(video_path: str, thumb_path: str) -> None:
-    cmd = [
-        FFMPEG_BIN, "-nostdin", "-y",
-        "-ss", "0.5",
-        "-i", video_path,
-        "-vframes", "1",
-        "-vf", "scale=320:-1",
-        str(thumb_path),
-    ]
-    proc = await asyncio.create_subprocess_exec(
-        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
-    )
-    await proc.communicate()
-
 
 @router.post("/reindex")
 async def reindex():
-    PREVIEWS_DIR.mkdir(parents=True, exist_ok=True)
-    files = sorted(
-        f for f in SOURCES_DIR.iterdir() if f.is_file() and f.suffix.lower() in EXTENSIONS
-    )
-    sources: list[Source] = []
-    for i, f in enumerate(files, 1):
-        info = await probe_video(str(f))
-        sources.append(
-            Source(
-                index=i,
-                filename=f.name,
-                duration=math.floor((info["duration"] - 0.1) * 10) / 10,
-                resolution=info["resolution"],
-                codec=info["codec"],
-                file_size=f.stat().st_size,
-            )
-        )
-        thumb = PREVIEWS_DIR / (f.stem + ".jpg")
-        if not thumb.exists():
-            await generate_thumbnail(str(f), str(thumb))
-    await state.set_sources(sources)
-    return {"status": "ok", "count": len(sources)}
+    count = await reindex_sources()
+    events.publish("sources", {"count": count})
+    return {"status": "ok", "count": count}
 
 
 class SourceTagsBody(BaseModel):
     tag_ids: list[int]
 
 
-@router.put("/{index}/tags")
-async def set_source_tags(index: int, body: SourceTagsBody):
-    sources = await state.get_sources()
-    src = next((s for s in sources if s.index == index), None)
+async def _get_source(index: int) -> Source:
+    src = (await catalog.get()).by_index.get(index)
     if not src:
         raise HTTPException(status_code=404, detail=f"Source {index} not found")
+    return src
+
+
+@router.put("/{index}/tags")
+async def set_source_tags(index: int, body: SourceTagsBody):
+    src = await _get_source(index)
     await state.set_source_tags(src.filename, body.tag_ids)
+    catalog.invalidate()
     return {"status": "ok"}
 
 
+@router.get("/{index}/snap")
+async def snap_to_keyframe(index: int, t: float, mode: SnapMode = "nearest"):
+    src = await _get_source(index)
+    packets = await get_packet_index(src.filename)
+    waveform = await get_waveform(src.filename)
+    return {
+        "t": t,
+        "keyframe": packets.snap(t, mode),
+        "audio_packet": packets.snap_audio(t, mode),
+        "silence": waveform.snap_silence(t) if waveform else None,
+    }
+
+
+@router.get("/{index}/cut-plan", response_model=CutPlan)
+async def cut_plan(index: int, start: float = 0, end: float | None = None):
+    src = await _get_source(index)
+    end = src.duration if end is None else min(end, src.duration)
+    if start < 0 or start >= end:
+        raise HTTPException(status_code=422, detail="Invalid start/end")
+    packets = await get_packet_index(src.filename)
+    return CutPlan(start=start, end=end, **packets.cut_plan(start, end))
+
+
+@router.get("/{index}/thumbnails")
+async def source_thumbnails(index: int):
+    """Poster, sprite sheets and WebVTT track for scrubbing; built now if reindex hasn't yet."""
+    src = await _get_source(index)
+    return await get_thumbnails(src.filename, src.duration, src.resolution)
+
+
+@router.get("/{index}/waveform")
+async def source_waveform(index: int, resolution: int = Query(1000, ge=1, le=100_000)):
+    """Peak and RMS amplitude (0..1) of the source's audio in ``resolution`` even bins."""
+    src = await _get_source(index)
+    waveform = await get_waveform(src.filename)
+    if waveform is None:
+        raise HTTPException(status_code=404, detail=f"Source {index} has no audio")
+    peaks, rms = waveform.resample(resolution)
+    return {
+        "duration": waveform.duration,
+        "resolution": len(peaks),
+        "peaks": [round(float(v), 4) for v in peaks],
+        "rms": [round(float(v), 4) for v in rms],
+    }
+
+
 @router.get("", response_model=list[Source])
 async def list_sources():
-    sources = await state.get_sources()
+    sources = (await catalog.get()).sources
     if not sources:
         raise HTTPException(status_code=409, detail="No index. Call POST /sources/reindex first.")
     return sources
@@ -0,0 +1,38 @@
+from fastapi import APIRouter
+
+from app.config import DEFAULT_ENCODER_PROFILE, ENCODER_PROFILES
+from app.db import pool
+from app.services.ffmpeg import thread_budget
+from app.services.segment_cache import segment_cache
+from app.services.storage import collect_garbage, usage
+
+router = APIRouter(prefix="/api/v1/system", tags=["system"])
+
+
+@router.get("/cache")
+async def cache_stats():
+    return segment_cache.stats()
+
+
+@router.get("/db")
+async def db_stats():
+    return pool.stats()
+
+
+@router.get("/profiles")
+async def encoder_profiles():
+    return {
+        "default": DEFAULT_ENCODER_PROFILE,
+        "profiles": ENCODER_PROFILES,
+        "threads": {"total": thread_budget.total, "in_use": thread_budget.in_use, "demand": thread_budget.demand},
+    }
+
+
+@router.get("/storage")
+async def storage_usage():
+    return await usage()
+
+
+@router.post("/storage/gc")
+async def storage_gc():
+    return await collect_garbage()
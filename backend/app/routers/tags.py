@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException
 
 from app import state
 from app.models.tag import Tag, TagCreate, TagUpdate
+from app.services.catalog import catalog
 
 router = APIRouter(prefix="/api/v1/tags", tags=["tags"])
 
@@ -24,6 +25,8 @@ async def rename_tag(tag_id: int, body: TagUpdate):
     tag = await state.rename_tag(tag_id, body.name)
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
+    # Sources carry their tags' names
+    catalog.invalidate()
     return tag
 
 
@@ -32,3 +35,4 @@ async def delete_tag(tag_id: int):
     deleted = await state.delete_tag(tag_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Tag not found")
+    catalog.invalidate()
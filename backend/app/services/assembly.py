@@ -1,24 +1,49 @@
+import asyncio
+import hashlib
+import json
+import time
 from pathlib import Path
 
-from app import state
-from app.config import MEDIA_DIR
-from app.models.assembly import Assembly
+from app import events, state
+from app.config import ENCODER_PROFILES, KEEP_INTERMEDIATES, MEDIA_DIR, RELEASE_AUDIO
+from app.metrics import ASSEMBLY_FAILURES, ASSEMBLY_SECONDS, FFMPEG_SECONDS
+from app.models.assembly import Assembly, ClipDetail
 from app.services.concat import concat_segments
-from app.services.cutter import cut_segment
+from app.services.cutter import cut_segment, segment_key
+from app.services.ffmpeg import ProgressCallback
+from app.services.filtergraph import render_filtergraph
+from app.services.hls import HlsPlaylist
 from app.services.probe import probe_video
+from app.services.progress import AssemblyProgress
+from app.services.proxies import proxy_for
+from app.services.release_audio import copy_cut
+from app.services.segment_cache import segment_cache
+from app.services.smart_render import smart_cut
+from app.services.storage import remove_intermediates
 
 
-async def run_assembly(asm: Assembly) -> None:
-    try:
-        asm_dir = MEDIA_DIR / asm.id
-        seg_dir = asm_dir / "segments"
-        seg_dir.mkdir(parents=True, exist_ok=True)
+def assembly_signature(asm: Assembly) -> str:
+    """Identical for assemblies that would render the same output: same engine and same segment keys in order."""
+    keys = [
+        segment_key(c.filename, c.start, c.end, asm.preview, c.pos, asm.release_mode, asm.profile)
+        for c in asm.clips
+    ]
+    return hashlib.sha256(json.dumps({"engine": asm.engine, "clips": keys}).encode()).hexdigest()
 
-        segment_paths: list[Path] = []
 
-        seg_ext = ".ts" if asm.preview else ".mp4"
-        for clip in asm.clips:
-            seg_path = seg_dir / f"{clip.pos:03d}{seg_ext}"
+async def _cut_clip(asm: Assembly, clip: ClipDetail, seg_path: Path, on_progress: ProgressCallback) -> None:
+    proxy = proxy_for(clip.filename, ENCODER_PROFILES[asm.profile]["height"]) if asm.preview else None
+    key = segment_key(
+        clip.filename, clip.start, clip.end, asm.preview, clip.pos, asm.release_mode, asm.profile, proxy is not None
+    )
+    async with segment_cache.lock(key):
+        if segment_cache.fetch(key, seg_path):
+            return
+        if not asm.preview and asm.release_mode == "smart":
+            await smart_cut(clip.filename, clip.start, clip.end, seg_path, on_progress)
+        elif not asm.preview and RELEASE_AUDIO != "encode":
+            await copy_cut(clip.filename, clip.start, clip.end, seg_path, on_progress)
+        else:
             await cut_segment(
                 filename=clip.filename,
                 start=clip.start,
@@ -26,19 +51,87 @@ async def run_assembly(asm: Assembly) -> None:
                 output_path=seg_path,
                 preview=asm.preview,
                 pos=clip.pos,
+                on_progress=on_progress,
+                profile=asm.profile,
+                input_path=proxy,
             )
-            segment_paths.append(seg_path)
+        segment_cache.store(key, seg_path)
+
 
+async def _cut_all(
+    asm: Assembly, seg_dir: Path, progress: AssemblyProgress, playlist: HlsPlaylist | None = None
+) -> list[Path]:
+    seg_ext = ".ts" if asm.preview else ".mp4"
+    segment_paths = [seg_dir / f"{clip.pos:03d}{seg_ext}" for clip in asm.clips]
+
+    async def cut(i: int, clip: ClipDetail, seg_path: Path) -> None:
+        await _cut_clip(asm, clip, seg_path, progress.clip_callback(clip.pos))
+        if playlist and playlist.segment_ready(i) and asm.stream_url is None:
+            asm.stream_url = f"/media/{asm.id}/{playlist.path.name}"
+            await state.update_assembly_progress(asm)
+            events.publish("assembly", asm.model_dump())
+        await progress.clip_finished(clip.pos)
+
+    # Concurrency is bounded by the shared ffmpeg pool, not here
+    tasks = [
+        asyncio.create_task(cut(i, clip, seg_path))
+        for i, (clip, seg_path) in enumerate(zip(asm.clips, segment_paths))
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return segment_paths
+
+
+async def run_assembly(asm: Assembly, worker: str | None = None) -> None:
+    """Render ``asm`` and record the outcome; ``worker`` is the scheduler holding its job, if any."""
+    mode = "preview" if asm.preview else "release"
+    t0 = time.perf_counter()
+    try:
+        asm_dir = MEDIA_DIR / asm.id
         result_path = asm_dir / "result.mp4"
-        await concat_segments(segment_paths, result_path)
+        progress = AssemblyProgress(asm)
+
+        if asm.engine == "filtergraph":
+            asm_dir.mkdir(parents=True, exist_ok=True)
+            with FFMPEG_SECONDS.time(op="filtergraph", mode=mode, codec=ENCODER_PROFILES[asm.profile]["codec"]):
+                await render_filtergraph(asm, result_path, progress.on_single_pass)
+        else:
+            seg_dir = asm_dir / "segments"
+            seg_dir.mkdir(parents=True, exist_ok=True)
+            playlist = None
+            if asm.preview:
+                # Playable as HLS from the first finished clip, long before the concat
+                playlist = HlsPlaylist(
+                    asm_dir / "index.m3u8", [(f"segments/{c.pos:03d}.ts", c.duration) for c in asm.clips]
+                )
+            segment_paths = await _cut_all(asm, seg_dir, progress, playlist)
+            if playlist:
+                playlist.finish()
+            with FFMPEG_SECONDS.time(op="concat", mode=mode, codec="copy"):
+                await concat_segments(segment_paths, result_path, progress.on_concat)
 
         info = await probe_video(str(result_path))
+        if not KEEP_INTERMEDIATES:
+            remove_intermediates(asm_dir)
+            # The playlist went with the segments; result.mp4 replaces it
+            asm.stream_url = None
 
         asm.status = "done"
+        asm.progress = 100.0
+        asm.eta = 0.0
         asm.duration = info["duration"]
         asm.output_url = f"/media/{asm.id}/result.mp4"
     except Exception as e:
         asm.status = "failed"
         asm.error = str(e)
-    finally:
-        await state.save_assembly(asm)
+        ASSEMBLY_FAILURES.inc(mode=mode)
+    ASSEMBLY_SECONDS.observe(time.perf_counter() - t0, mode=mode, engine=asm.engine, status=asm.status)
+    # Not reached on cancellation: an interrupted assembly stays in the job queue for recovery.
+    # A deleted or reassigned one is left alone, even when a remote worker never saw the cancel.
+    if await state.finish_assembly(asm, worker):
+        events.publish("assembly", asm.model_dump())
@@ -0,0 +1,46 @@
+import asyncio
+
+from app import state
+from app.models.source import Source
+
+
+class CatalogSnapshot:
+    """One consistent view of the sources, indexed by position and filename."""
+
+    def __init__(self, sources: list[Source]):
+        self.sources = sources
+        self.by_index = {s.index: s for s in sources}
+        self.by_filename = {s.filename: s for s in sources}
+
+
+class SourceCatalog:
+    """Sources (with their tags) held in memory so request handlers never query them.
+
+    Loaded on first use and reloaded after anything that changes sources or tags;
+    call ``invalidate()`` after such a write. A load racing an invalidation is
+    discarded and retried rather than cached stale.
+    """
+
+    def __init__(self):
+        self._snapshot: CatalogSnapshot | None = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        async with self._lock:
+            while self._snapshot is None:
+                generation = self._generation
+                snapshot = CatalogSnapshot(await state.get_sources())
+                if generation == self._generation:
+                    self._snapshot = snapshot
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._snapshot = None
+
+
+catalog = SourceCatalog()
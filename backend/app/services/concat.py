@@ -1,10 +1,12 @@
-import asyncio
 from pathlib import Path
 
 from app.config import FFMPEG_BIN
+from app.services.ffmpeg import ProgressCallback, run_ffmpeg
 
 
-async def concat_segments(segment_paths: list[Path], output_path: Path) -> None:
+async def concat_segments(
+    segment_paths: list[Path], output_path: Path, on_progress: ProgressCallback | None = None,
+) -> None:
     list_file = output_path.parent / "concat_list.txt"
     list_file.write_text("\n".join(f"file '{p.resolve()}'" for p in segment_paths))
 
@@ -14,14 +16,9 @@ async def concat_segments(segment_paths: list[Path], output_path: Path) -> None:
         "-safe", "0",
         "-i", str(list_file),
         "-c", "copy",
+        # Moov atom up front so browsers can start playback and seek before the whole file loads
+        "-movflags", "+faststart",
         str(output_path),
     ]
 
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    _, stderr = await proc.communicate()
-    if proc.returncode != 0:
-        raise RuntimeError(f"ffmpeg concat failed: {stderr.decode()}")
+    await run_ffmpeg(cmd, "concat", on_progress)
@@ -1,7 +1,76 @@
-import asyncio
+import hashlib
+import json
 from pathlib import Path
 
-from app.config import AUDIO_BITRATE, AUDIO_CODEC, AUDIO_FADE_MS, FFMPEG_BIN, SOURCES_DIR
+from app.config import (
+    AUDIO_BITRATE,
+    AUDIO_CODEC,
+    AUDIO_FADE_MS,
+    DEFAULT_ENCODER_PROFILE,
+    ENCODER_PROFILES,
+    FFMPEG_BIN,
+    PROXY_HEIGHT,
+    RELEASE_AUDIO,
+    SOURCES_DIR,
+)
+from app.metrics import FFMPEG_SECONDS
+from app.services.ffmpeg import ProgressCallback, run_ffmpeg
+
+AUDIO_ARGS = ["-c:a", AUDIO_CODEC, "-b:a", AUDIO_BITRATE]
+
+
+def profile_video_args(profile: str) -> list[str]:
+    p = ENCODER_PROFILES[profile]
+    return ["-c:v", p["codec"], "-preset", p["preset"], "-crf", str(p["crf"])]
+
+
+def profile_audio_args(profile: str) -> list[str]:
+    p = ENCODER_PROFILES[profile]
+    return ["-c:a", p["audio_codec"], "-b:a", p["audio_bitrate"]]
+
+
+def segment_key(
+    filename: str,
+    start: float,
+    end: float,
+    preview: bool,
+    pos: int = 0,
+    release_mode: str = "copy",
+    profile: str = DEFAULT_ENCODER_PROFILE,
+    proxy: bool = False,
+) -> str:
+    """Cache key covering everything that affects the bytes cut_segment writes."""
+    st = (SOURCES_DIR / filename).stat()
+    params = {
+        "source": [filename, st.st_size, st.st_mtime_ns],
+        "start": start,
+        "end": end,
+        "preview": preview,
+        "proxy": PROXY_HEIGHT if proxy else None,
+        # The preview overlay burns the clip position into the picture
+        "pos": pos if preview else None,
+        "fade_ms": AUDIO_FADE_MS,
+        "video": [*profile_video_args(profile), ENCODER_PROFILES[profile]["height"]] if preview else release_mode,
+        "audio": profile_audio_args(profile) if preview else [*AUDIO_ARGS, RELEASE_AUDIO],
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def preview_video_filter(filename: str, pos: int, scale: str) -> str:
+    """Timecode/label overlay drawn on preview cuts."""
+    safe_name = filename.replace("'", "\\'").replace(":", "\\:")
+    label = f"[{pos}] {safe_name}"
+    return (
+        f"setpts=PTS-STARTPTS,{scale},"
+        f"drawtext=text='{label}':x=10:y=10:fontsize=24:fontcolor=white:borderw=2:bordercolor=black,"
+        f"drawtext=text='%{{pts\\:hms}}':x=10:y=38:fontsize=24:fontcolor=white:borderw=2:bordercolor=black"
+    )
+
+
+def audio_fade_filter(duration: float) -> str:
+    fade_sec = AUDIO_FADE_MS / 1000.0
+    fade_out_start = max(0, duration - fade_sec)
+    return f"afade=t=in:st=0:d={fade_sec},afade=t=out:st={fade_out_start}:d={fade_sec}"
 
 
 async def cut_segment(
@@ -11,31 +80,25 @@ async def cut_segment(
     output_path: Path,
     preview: bool,
     pos: int = 0,
+    on_progress: ProgressCallback | None = None,
+    profile: str = DEFAULT_ENCODER_PROFILE,
+    input_path: Path | None = None,
 ) -> None:
+    """Cut one clip. ``input_path`` overrides the source file, e.g. with its proxy for previews."""
     duration = end - start
-    fade_sec = AUDIO_FADE_MS / 1000.0
-    fade_out_start = max(0, duration - fade_sec)
 
-    input_path = str(SOURCES_DIR / filename)
+    input_path = str(input_path or SOURCES_DIR / filename)
 
     if preview:
-        safe_name = filename.replace("'", "\\'").replace(":", "\\:")
-        label = f"[{pos}] {safe_name}"
-        vf = (
-            "setpts=PTS-STARTPTS,scale=-2:720,"
-            f"drawtext=text='{label}':x=10:y=10:fontsize=24:fontcolor=white:borderw=2:bordercolor=black,"
-            f"drawtext=text='%{{pts\\:hms}}':x=10:y=38:fontsize=24:fontcolor=white:borderw=2:bordercolor=black"
-        )
         cmd = [
             FFMPEG_BIN, "-nostdin", "-y",
             "-ss", str(start),
             "-t", str(duration),
             "-i", input_path,
-            "-vf", vf,
-            "-af", f"asetpts=PTS-STARTPTS,"
-                   f"afade=t=in:st=0:d={fade_sec},afade=t=out:st={fade_out_start}:d={fade_sec}",
-            "-c:v", "libx264", "-preset", "ultrafast", "-crf", "28",
-            "-c:a", AUDIO_CODEC, "-b:a", AUDIO_BITRATE,
+            "-vf", preview_video_filter(filename, pos, f"scale=-2:{ENCODER_PROFILES[profile]['height']}"),
+            "-af", f"asetpts=PTS-STARTPTS,{audio_fade_filter(duration)}",
+            *profile_video_args(profile),
+            *profile_audio_args(profile),
             "-shortest", "-fflags", "+igndts",
             str(output_path),
         ]
@@ -47,16 +110,12 @@ async def cut_segment(
             "-to", str(end),
             "-i", input_path,
             "-c:v", "copy",
-            "-af", f"afade=t=in:st=0:d={fade_sec},afade=t=out:st={fade_out_start}:d={fade_sec}",
-            "-c:a", AUDIO_CODEC, "-b:a", AUDIO_BITRATE,
+            "-af", audio_fade_filter(duration),
+            *AUDIO_ARGS,
             str(output_path),
         ]
 
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    _, stderr = await proc.communicate()
-    if proc.returncode != 0:
-        raise RuntimeError(f"ffmpeg cut failed: {stderr.decode()}")
+    threads = ENCODER_PROFILES[profile]["threads"] if preview else None
+    codec = ENCODER_PROFILES[profile]["codec"] if preview else "copy"
+    with FFMPEG_SECONDS.time(op="cut", mode="preview" if preview else "release", codec=codec):
+        await run_ffmpeg(cmd, "cut", on_progress, threads=threads)
@@ -0,0 +1,147 @@
+import asyncio
+import os
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+
+from app.config import FFMPEG_THREADS, FFMPEG_WORKERS
+from app.metrics import FFMPEG_FAILURES, FFMPEG_RUNNING
+
+# Shared by every assembly so concurrent jobs can't oversubscribe the box
+ffmpeg_slots = asyncio.Semaphore(FFMPEG_WORKERS)
+
+ProgressCallback = Callable[[dict], Awaitable[None]]
+OutputCallback = Callable[[bytes], None]
+
+
+class ThreadBudget:
+    """Divides FFMPEG_THREADS between encodes so concurrent ones don't each spawn a thread per core.
+
+    An encode is sized when it gets its slot: an even share of the budget across every
+    encode running or waiting, limited to what is still free. Grants never add up to more
+    than the budget; an encode that finds none free waits for one to be released, and is
+    then sized again against whatever demand is left.
+    """
+
+    def __init__(self, total: int, max_running: int):
+        self.total = total
+        self.max_running = max_running
+        self.in_use = 0
+        self.demand = 0
+        self._released = asyncio.Condition()
+
+    @contextmanager
+    def wanted(self, threads: int | None) -> Iterator[None]:
+        self.demand += threads is not None
+        try:
+            yield
+        finally:
+            self.demand -= threads is not None
+
+    def _share(self, threads: int) -> int:
+        fair = self.total // max(1, min(self.max_running, self.demand))
+        granted = min(max(1, fair), self.total - self.in_use)
+        return min(granted, threads) if threads else granted
+
+    @asynccontextmanager
+    async def grant(self, threads: int | None) -> AsyncIterator[int | None]:
+        if threads is None:
+            yield None
+            return
+        # Let encodes submitted in the same burst register their demand before this one is sized
+        await asyncio.sleep(0)
+        async with self._released:
+            while (granted := self._share(threads)) < 1:
+                await self._released.wait()
+            self.in_use += granted
+        try:
+            yield granted
+        finally:
+            self.in_use -= granted
+            async with self._released:
+                self._released.notify_all()
+
+
+thread_budget = ThreadBudget(FFMPEG_THREADS, FFMPEG_WORKERS)
+
+
+def _number(value: str | None) -> float | None:
+    try:
+        return float(value.rstrip("x"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _parse_progress(block: dict[str, str]) -> dict:
+    out_time_us = _number(block.get("out_time_us"))
+    return {
+        "out_time": max(0.0, out_time_us / 1_000_000) if out_time_us is not None else None,
+        "fps": _number(block.get("fps")),
+        "speed": _number(block.get("speed")),
+        "done": block.get("progress") == "end",
+    }
+
+
+async def _read_progress(stream: asyncio.StreamReader, on_progress: ProgressCallback) -> None:
+    # -progress emits key=value lines; each block ends with progress=continue|end
+    block: dict[str, str] = {}
+    async for line in stream:
+        key, _, value = line.decode(errors="replace").strip().partition("=")
+        block[key] = value
+        if key == "progress":
+            await on_progress(_parse_progress(block))
+            block = {}
+
+
+async def _read_output(stream: asyncio.StreamReader, on_output: OutputCallback) -> None:
+    while chunk := await stream.read(1 << 16):
+        on_output(chunk)
+
+
+async def run_ffmpeg(
+    cmd: list[str],
+    what: str,
+    on_progress: ProgressCallback | None = None,
+    threads: int | None = None,
+    on_output: OutputCallback | None = None,
+    nice: int = 0,
+) -> None:
+    """Run ffmpeg in a shared slot. Encodes pass ``threads`` (a cap, 0 for none) to be sized from the budget.
+
+    Commands writing to ``pipe:1`` pass ``on_output`` to receive stdout as it arrives, without ``on_progress``.
+    Background work passes ``nice`` to run below the encodes someone is waiting for.
+    """
+    if on_progress:
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    with thread_budget.wanted(threads):
+        async with ffmpeg_slots:
+            async with thread_budget.grant(threads) as granted:
+                if granted is not None:
+                    # -threads is an output option, so it goes right before the output path
+                    cmd = [*cmd[:-1], "-threads", str(granted), cmd[-1]]
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    preexec_fn=(lambda: os.nice(nice)) if nice else None,
+                )
+                stderr_task = asyncio.create_task(proc.stderr.read())
+                FFMPEG_RUNNING.inc()
+                try:
+                    if on_progress:
+                        await _read_progress(proc.stdout, on_progress)
+                    elif on_output:
+                        await _read_output(proc.stdout, on_output)
+                    else:
+                        await proc.stdout.read()
+                    stderr = await stderr_task
+                    await proc.wait()
+                except BaseException:
+                    stderr_task.cancel()
+                    proc.kill()
+                    await proc.wait()
+                    raise
+                finally:
+                    FFMPEG_RUNNING.dec()
+    if proc.returncode != 0:
+        FFMPEG_FAILURES.inc(what=what)
+        raise RuntimeError(f"ffmpeg {what} failed: {stderr.decode()}")
@@ -0,0 +1,68 @@
+import asyncio
+from collections.abc import Collection
+from pathlib import Path
+
+from app.config import ENCODER_PROFILES, FFMPEG_BIN, SOURCES_DIR
+from app.models.assembly import Assembly
+from app.services.cutter import audio_fade_filter, preview_video_filter, profile_audio_args, profile_video_args
+from app.services.ffmpeg import ProgressCallback, run_ffmpeg
+from app.services.probe import has_audio
+from app.services.proxies import proxy_for
+
+AUDIO_FORMAT = "aresample=48000,aformat=sample_fmts=fltp:channel_layouts=stereo"
+
+
+def fit_16x9(height: int) -> str:
+    """The concat filter needs identical frame geometry, so letterbox everything to one 16:9 size."""
+    width = height * 16 // 9 // 2 * 2
+    return (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    )
+
+
+def clip_input(filename: str, height: int) -> Path:
+    return proxy_for(filename, height) or SOURCES_DIR / filename
+
+
+def build_filtergraph_command(asm: Assembly, output_path: Path, silent: Collection[str] = ()) -> list[str]:
+    """``silent`` lists the input paths without an audio stream; their clips get silence instead."""
+    height = ENCODER_PROFILES[asm.profile]["height"]
+    fit = fit_16x9(height)
+    cmd = [FFMPEG_BIN, "-nostdin", "-y"]
+    chains = []
+    for i, clip in enumerate(asm.clips):
+        source = str(clip_input(clip.filename, height))
+        cmd += ["-ss", str(clip.start), "-t", str(clip.duration), "-i", source]
+        chains.append(f"[{i}:v]{preview_video_filter(clip.filename, clip.pos, scale=fit)}[v{i}]")
+        if source in silent:
+            chains.append(f"anullsrc,{AUDIO_FORMAT},atrim=duration={clip.duration}[a{i}]")
+            continue
+        # Pad/trim audio to the clip length so concat keeps audio and video in sync
+        chains.append(
+            f"[{i}:a]asetpts=PTS-STARTPTS,{audio_fade_filter(clip.duration)},{AUDIO_FORMAT},"
+            f"apad,atrim=duration={clip.duration}[a{i}]"
+        )
+    inputs = "".join(f"[v{i}][a{i}]" for i in range(len(asm.clips)))
+    chains.append(f"{inputs}concat=n={len(asm.clips)}:v=1:a=1[v][a]")
+    return [
+        *cmd,
+        "-filter_complex", ";".join(chains),
+        "-map", "[v]", "-map", "[a]",
+        *profile_video_args(asm.profile),
+        *profile_audio_args(asm.profile),
+        "-movflags", "+faststart",
+        str(output_path),
+    ]
+
+
+async def render_filtergraph(asm: Assembly, output_path: Path, on_progress: ProgressCallback | None = None) -> None:
+    """Single-pass preview: trim, overlay, fade and concatenate every clip in one ffmpeg run."""
+    height = ENCODER_PROFILES[asm.profile]["height"]
+    sources = sorted({str(clip_input(clip.filename, height)) for clip in asm.clips})
+    audio = await asyncio.gather(*(has_audio(source) for source in sources))
+    silent = {source for source, a in zip(sources, audio) if not a}
+    threads = ENCODER_PROFILES[asm.profile]["threads"]
+    await run_ffmpeg(
+        build_filtergraph_command(asm, output_path, silent), "filtergraph", on_progress, threads=threads
+    )
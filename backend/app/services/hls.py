@@ -0,0 +1,55 @@
+import math
+import os
+from pathlib import Path
+
+
+class HlsPlaylist:
+    """EVENT playlist over a preview's per-clip MPEG-TS segments.
+
+    Clips finish out of order, so only the contiguous run of finished clips from
+    the start is listed; players can start on the first one while the rest cut.
+    """
+
+    def __init__(self, path: Path, segments: list[tuple[str, float]]):
+        self.path = path
+        self.segments = segments
+        self.ready = [False] * len(segments)
+        self.listed = 0
+        self.ended = False
+        self._write()
+
+    def segment_ready(self, index: int) -> bool:
+        """Mark a segment finished; True when that made the playlist grow."""
+        self.ready[index] = True
+        listed = self.listed
+        while self.listed < len(self.segments) and self.ready[self.listed]:
+            self.listed += 1
+        if self.listed == listed:
+            return False
+        self._write()
+        return True
+
+    def finish(self) -> None:
+        self.ended = True
+        self._write()
+
+    def _write(self) -> None:
+        # Target duration must cover every segment ever listed, so fix it up front
+        target = math.ceil(max((duration for _, duration in self.segments), default=1))
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{target}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for i, (uri, duration) in enumerate(self.segments[:self.listed]):
+            # Every cut restarts its timestamps at zero
+            if i:
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines += [f"#EXTINF:{duration:.3f},", uri]
+        if self.ended:
+            lines.append("#EXT-X-ENDLIST")
+        tmp = self.path.with_suffix(".m3u8.tmp")
+        tmp.write_text("\n".join(lines) + "\n")
+        os.replace(tmp, self.path)
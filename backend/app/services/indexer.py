@@ -0,0 +1,107 @@
+import asyncio
+import math
+from pathlib import Path
+
+from app import state
+from app.config import FFMPEG_WORKERS, PREVIEWS_DIR, SOURCES_DIR
+from app.models.source import Source
+from app.services.catalog import catalog
+from app.services.packet_index import build_packet_index, forget_packet_index
+from app.services.probe import probe_video
+from app.services.proxies import remove_proxy, schedule_proxies
+from app.services.thumbnails import generate_thumbnails, poster_path, remove_thumbnails, thumbnail_info
+from app.services.waveform import get_waveform, remove_waveform, waveform_current
+
+EXTENSIONS = {".mp4", ".mov", ".mkv", ".webm"}
+
+_reindex_lock = asyncio.Lock()
+
+
+async def _thumbnails(filename: str, duration: float, resolution: str) -> None:
+    try:
+        await generate_thumbnails(filename, duration, resolution)
+    except RuntimeError as e:
+        # Not worth failing the reindex over; the next one retries
+        print(f"Thumbnails for {filename} failed: {e}")
+
+
+async def _waveform(filename: str) -> None:
+    try:
+        await get_waveform(filename)
+    except RuntimeError as e:
+        print(f"Waveform for {filename} failed: {e}")
+
+
+async def _index_file(f: Path, index: int, slots: asyncio.Semaphore) -> Source:
+    async with slots:
+        info = await probe_video(str(f))
+        await _thumbnails(f.name, info["duration"], info["resolution"])
+        await build_packet_index(f.name)
+        await _waveform(f.name)
+    return Source(
+        index=index,
+        filename=f.name,
+        duration=math.floor((info["duration"] - 0.1) * 10) / 10,
+        resolution=info["resolution"],
+        codec=info["codec"],
+        file_size=f.stat().st_size,
+    )
+
+
+async def reindex_sources() -> int:
+    """Sync the sources table with SOURCES_DIR, probing only new or modified files."""
+    async with _reindex_lock:
+        PREVIEWS_DIR.mkdir(parents=True, exist_ok=True)
+        files = sorted(
+            f for f in SOURCES_DIR.iterdir() if f.is_file() and f.suffix.lower() in EXTENSIONS
+        )
+        known = await state.get_source_rows()
+        indexed = await state.get_packet_index_stamps()
+        slots = asyncio.Semaphore(FFMPEG_WORKERS)
+
+        async def backfill_file(f: Path, row: dict, packets: bool) -> None:
+            async with slots:
+                if thumbnail_info(f.name) is None or not poster_path(f.name).exists():
+                    await _thumbnails(f.name, row["duration"], row["resolution"])
+                if packets:
+                    await build_packet_index(f.name)
+                if not waveform_current(f.name):
+                    await _waveform(f.name)
+
+        upserts: list[tuple[Source, int]] = []
+        pending: list[tuple[asyncio.Task, int]] = []
+        backfill: list[asyncio.Task] = []
+        for i, f in enumerate(files, 1):
+            st = f.stat()
+            row = known.get(f.name)
+            if row and row["file_size"] == st.st_size and row["mtime_ns"] == st.st_mtime_ns:
+                stale_packets = indexed.get(f.name) != (st.st_size, st.st_mtime_ns)
+                stale_thumbs = thumbnail_info(f.name) is None or not poster_path(f.name).exists()
+                if stale_packets or stale_thumbs or not waveform_current(f.name):
+                    backfill.append(asyncio.create_task(backfill_file(f, row, stale_packets)))
+                if row["idx"] != i:
+                    upserts.append((Source(
+                        index=i, filename=f.name, duration=row["duration"], resolution=row["resolution"],
+                        codec=row["codec"], file_size=row["file_size"],
+                    ), st.st_mtime_ns))
+                continue
+            pending.append((asyncio.create_task(_index_file(f, i, slots)),
+                            st.st_mtime_ns))
+
+        if pending:
+            probed = await asyncio.gather(*(task for task, _ in pending))
+            upserts.extend(zip(probed, (mtime_ns for _, mtime_ns in pending)))
+        await asyncio.gather(*backfill)
+
+        names = {f.name for f in files}
+        removed = [name for name in known if name not in names]
+        for name in removed:
+            forget_packet_index(name)
+            remove_proxy(name)
+            remove_thumbnails(name)
+            remove_waveform(name)
+        if upserts or removed:
+            await state.sync_sources(upserts, removed)
+            catalog.invalidate()
+        schedule_proxies([f.name for f in files])
+        return len(files)
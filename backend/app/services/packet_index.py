@@ -0,0 +1,132 @@
+import bisect
+from array import array
+from typing import Literal
+
+from app import state
+from app.config import SOURCES_DIR
+from app.services.probe import probe_packets
+
+SnapMode = Literal["before", "after", "nearest"]
+
+
+def _snap(times: array, t: float, mode: SnapMode) -> float | None:
+    if not times:
+        return None
+    i = bisect.bisect_right(times, t)
+    before = times[i - 1] if i > 0 else None
+    # bisect_right puts an exact hit on the "before" side
+    after = before if before == t else (times[i] if i < len(times) else None)
+    if mode == "before":
+        return before if before is not None else times[0]
+    if mode == "after":
+        return after if after is not None else times[-1]
+    if before is None or after is None:
+        return before if after is None else after
+    return before if t - before <= after - t else after
+
+
+class PacketIndex:
+    """Keyframe and audio packet positions of one source, stored as flat arrays.
+
+    ``gop_sizes[i]`` is the number of video packets from ``keyframes[i]`` up to
+    the next keyframe; ``offsets[i]`` is the byte position of that keyframe.
+    """
+
+    def __init__(self, keyframes: array, offsets: array, gop_sizes: array, audio: array):
+        self.keyframes = keyframes
+        self.offsets = offsets
+        self.gop_sizes = gop_sizes
+        self.audio = audio
+
+    @classmethod
+    def from_packets(cls, packets: dict[str, list[dict]]) -> "PacketIndex":
+        keyframes, offsets, gop_sizes = array("d"), array("q"), array("I")
+        video = sorted(packets["video"], key=lambda p: p["t"])
+        for p in video:
+            if p["key"]:
+                keyframes.append(p["t"])
+                offsets.append(p["pos"])
+                gop_sizes.append(0)
+            if gop_sizes:
+                gop_sizes[-1] += 1
+        audio = array("d", sorted(p["t"] for p in packets["audio"]))
+        return cls(keyframes, offsets, gop_sizes, audio)
+
+    @classmethod
+    def from_row(cls, row: dict) -> "PacketIndex":
+        arrays = []
+        for typecode, column in (("d", "keyframes"), ("q", "offsets"), ("I", "gop_sizes"), ("d", "audio")):
+            a = array(typecode)
+            a.frombytes(row[column])
+            arrays.append(a)
+        return cls(*arrays)
+
+    def to_blobs(self) -> tuple[bytes, bytes, bytes, bytes]:
+        return self.keyframes.tobytes(), self.offsets.tobytes(), self.gop_sizes.tobytes(), self.audio.tobytes()
+
+    def snap(self, t: float, mode: SnapMode = "nearest") -> float | None:
+        return _snap(self.keyframes, t, mode)
+
+    def snap_audio(self, t: float, mode: SnapMode = "nearest") -> float | None:
+        return _snap(self.audio, t, mode)
+
+    def interior(self, start: float, end: float) -> tuple[int, int] | None:
+        """Indexes of the first and last keyframe in [start, end], or None when no whole GOP fits."""
+        i = bisect.bisect_left(self.keyframes, start)
+        j = bisect.bisect_right(self.keyframes, end) - 1
+        if i >= len(self.keyframes) or j < 0 or i >= j:
+            return None
+        return i, j
+
+    def cut_plan(self, start: float, end: float) -> dict:
+        """How a smart-render cut of [start, end] splits into re-encoded edges and a stream-copied middle."""
+        span = self.interior(start, end)
+        if span is None:
+            return {
+                "copy_start": None, "copy_end": None, "copy_seconds": 0.0, "copy_bytes": 0,
+                "reencode_seconds": end - start, "reencode_frames": None,
+            }
+        i, j = span
+        k1, k2 = self.keyframes[i], self.keyframes[j]
+        # The GOPs straddling start and end are the ones that get decoded and re-encoded
+        head = self.gop_sizes[i - 1] if k1 > start and i > 0 else 0
+        tail = self.gop_sizes[j] if end > k2 else 0
+        return {
+            "copy_start": k1,
+            "copy_end": k2,
+            "copy_seconds": k2 - k1,
+            "copy_bytes": max(0, self.offsets[j] - self.offsets[i]),
+            "reencode_seconds": (k1 - start) + (end - k2),
+            "reencode_frames": head + tail,
+        }
+
+
+# filename -> (file_size, mtime_ns, index); avoids a DB round trip per clip
+_loaded: dict[str, tuple[int, int, PacketIndex]] = {}
+
+
+async def build_packet_index(filename: str) -> PacketIndex:
+    path = SOURCES_DIR / filename
+    st = path.stat()
+    index = PacketIndex.from_packets(await probe_packets(str(path)))
+    await state.save_packet_index(filename, st.st_size, st.st_mtime_ns, index.to_blobs())
+    _loaded[filename] = (st.st_size, st.st_mtime_ns, index)
+    return index
+
+
+async def get_packet_index(filename: str) -> PacketIndex:
+    """Index for a source, rebuilt when the file on disk no longer matches the stored one."""
+    st = (SOURCES_DIR / filename).stat()
+    cached = _loaded.get(filename)
+    if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+        return cached[2]
+    row = await state.get_packet_index(filename)
+    if row and (row["file_size"], row["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+        index = PacketIndex.from_row(row)
+        _loaded[filename] = (st.st_size, st.st_mtime_ns, index)
+        return index
+    return await build_packet_index(filename)
+
+
+def forget_packet_index(filename: str) -> None:
+    _loaded.pop(filename, None)
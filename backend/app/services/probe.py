@@ -2,20 +2,22 @@ import asyncio
 import json
 
 from app.config import FFPROBE_BIN
+from app.metrics import FFMPEG_SECONDS
 
 
 async def ffprobe(path: str) -> dict:
-    proc = await asyncio.create_subprocess_exec(
-        FFPROBE_BIN,
-        "-v", "quiet",
-        "-print_format", "json",
-        "-show_format",
-        "-show_streams",
-        path,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, _ = await proc.communicate()
+    with FFMPEG_SECONDS.time(op="ffprobe", mode="", codec=""):
+        proc = await asyncio.create_subprocess_exec(
+            FFPROBE_BIN,
+            "-v", "quiet",
+            "-print_format", "json",
+            "-show_format",
+            "-show_streams",
+            path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await proc.communicate()
     return json.loads(stdout)
 
 
@@ -33,3 +35,41 @@ async def probe_video(path: str) -> dict:
         resolution = "unknown"
         codec = "unknown"
     return {"duration": duration, "resolution": resolution, "codec": codec}
+
+
+async def has_audio(path: str) -> bool:
+    data = await ffprobe(path)
+    return any(s["codec_type"] == "audio" for s in data.get("streams", []))
+
+
+async def probe_packets(path: str) -> dict[str, list[dict]]:
+    """Per-packet pts_time, byte offset and flags of the first video and audio streams, in demux order."""
+    data = await ffprobe(path)
+    start_time = float(data.get("format", {}).get("start_time", 0) or 0)
+    proc = await asyncio.create_subprocess_exec(
+        FFPROBE_BIN,
+        "-v", "quiet",
+        "-show_entries", "packet=codec_type,stream_index,pts_time,pos,flags",
+        "-of", "compact=p=0",
+        path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    with FFMPEG_SECONDS.time(op="ffprobe_packets", mode="", codec=""):
+        stdout, _ = await proc.communicate()
+    packets: dict[str, list[dict]] = {"video": [], "audio": []}
+    first_stream: dict[str, str] = {}
+    for line in stdout.decode().splitlines():
+        fields = dict(field.split("=", 1) for field in line.split("|") if "=" in field)
+        codec_type = fields.get("codec_type", "")
+        if codec_type not in packets or fields.get("pts_time") in (None, "N/A"):
+            continue
+        if first_stream.setdefault(codec_type, fields.get("stream_index", "")) != fields.get("stream_index", ""):
+            continue
+        kind = packets[codec_type]
+        kind.append({
+            "t": float(fields["pts_time"]) - start_time,
+            "pos": int(fields["pos"]) if fields.get("pos", "N/A") != "N/A" else -1,
+            "key": "K" in fields.get("flags", ""),
+        })
+    return packets
@@ -0,0 +1,88 @@
+import time
+
+from app import events, state
+from app.models.assembly import Assembly
+
+PUBLISH_INTERVAL = 0.5
+SAVE_INTERVAL = 2.0
+# Share of the overall percentage attributed to cutting; the rest is the final concat
+CUT_WEIGHT = 0.9
+
+
+class AssemblyProgress:
+    """Aggregates ffmpeg -progress reports of one assembly into overall figures.
+
+    Per-clip percentages go out on the event stream; overall percentage, summed
+    encode fps/speed of running cuts and ETA are kept on the Assembly and
+    persisted every few seconds.
+    """
+
+    def __init__(self, asm: Assembly):
+        self.asm = asm
+        self.started = time.monotonic()
+        self.encoded = {c.pos: 0.0 for c in asm.clips}
+        self.running: dict[int, tuple[float, float]] = {}
+        self.finished: set[int] = set()
+        self.concat = 0.0
+        self._published = 0.0
+        self._saved = 0.0
+
+    def clip_callback(self, clip_pos: int):
+        async def on_progress(info: dict) -> None:
+            if info["out_time"] is not None:
+                self.encoded[clip_pos] = info["out_time"]
+            self.running[clip_pos] = (info["fps"] or 0.0, info["speed"] or 0.0)
+            await self.update()
+        return on_progress
+
+    async def clip_finished(self, clip_pos: int) -> None:
+        self.running.pop(clip_pos, None)
+        self.finished.add(clip_pos)
+        await self.update(force=True)
+
+    async def on_concat(self, info: dict) -> None:
+        if info["out_time"] is not None:
+            self.concat = info["out_time"]
+        await self.update()
+
+    async def on_single_pass(self, info: dict) -> None:
+        """Progress of an engine that renders every clip and the concat in one run."""
+        if info["out_time"] is not None:
+            remaining = self.concat = info["out_time"]
+            for clip in self.asm.clips:
+                self.encoded[clip.pos] = min(clip.duration, remaining)
+                remaining = max(0.0, remaining - clip.duration)
+        self.running[0] = (info["fps"] or 0.0, info["speed"] or 0.0)
+        await self.update()
+
+    def _clip_percent(self, clip) -> float:
+        if clip.pos in self.finished:
+            return 100.0
+        return min(100.0, 100.0 * self.encoded[clip.pos] / clip.duration) if clip.duration else 0.0
+
+    async def update(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._published < PUBLISH_INTERVAL:
+            return
+        self._published = now
+
+        asm = self.asm
+        total = sum(c.duration for c in asm.clips) or 1.0
+        clips = {c.pos: self._clip_percent(c) for c in asm.clips}
+        cut = sum(clips[c.pos] * c.duration for c in asm.clips) / 100.0 / total
+        percent = 100.0 * (CUT_WEIGHT * cut + (1 - CUT_WEIGHT) * min(1.0, self.concat / total))
+        elapsed = now - self.started
+        asm.progress = round(percent, 1)
+        asm.fps = round(sum(fps for fps, _ in self.running.values()), 1)
+        asm.speed = round(sum(speed for _, speed in self.running.values()), 2)
+        asm.eta = round(elapsed * (100.0 - percent) / percent, 1) if percent > 0 else None
+
+        events.publish("progress", {
+            "id": asm.id, "progress": asm.progress, "fps": asm.fps, "speed": asm.speed, "eta": asm.eta,
+            "stream_url": asm.stream_url,
+            "clips": {str(pos): round(p, 1) for pos, p in clips.items()},
+            "done": len(self.finished), "total": len(asm.clips),
+        })
+        if now - self._saved >= SAVE_INTERVAL:
+            self._saved = now
+            await state.update_assembly_progress(asm)
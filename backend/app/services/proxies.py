@@ -0,0 +1,90 @@
+import asyncio
+import os
+from pathlib import Path
+
+from app.config import FFMPEG_BIN, PROXIES, PROXIES_DIR, PROXY_HEIGHT, PROXY_THREADS, PROXY_WORKERS, SOURCES_DIR
+from app.services.ffmpeg import run_ffmpeg
+
+# One keyframe every half second at 25 fps keeps preview seeks nearly decode-free
+PROXY_VIDEO_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "20", "-g", "12", "-pix_fmt", "yuv420p"]
+
+_slots = asyncio.Semaphore(PROXY_WORKERS)
+_building: dict[str, asyncio.Task] = {}
+
+
+def proxy_path(filename: str) -> Path:
+    return PROXIES_DIR / f"{filename}.mp4"
+
+
+def proxy_for(filename: str, height: int | None = None) -> Path | None:
+    """The proxy of a source if it was built from the file currently on disk.
+
+    With ``height``, only if proxies are at least that tall, so a preview is never upscaled from one.
+    """
+    if height is not None and PROXY_HEIGHT < height:
+        return None
+    # A finished proxy carries its source's mtime, so a replaced source makes it stale
+    try:
+        current = proxy_path(filename).stat().st_mtime_ns == (SOURCES_DIR / filename).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return proxy_path(filename) if current else None
+
+
+async def build_proxy(filename: str) -> None:
+    source = SOURCES_DIR / filename
+    dest = proxy_path(filename)
+    tmp = dest.with_suffix(".part.mp4")
+    PROXIES_DIR.mkdir(parents=True, exist_ok=True)
+    mtime_ns = source.stat().st_mtime_ns
+    cmd = [
+        FFMPEG_BIN, "-nostdin", "-y",
+        "-i", str(source),
+        "-map", "0:v:0", "-map", "0:a:0?",
+        # Never upscale sources that are already small
+        "-vf", f"scale=-2:'min({PROXY_HEIGHT},ih)'",
+        *PROXY_VIDEO_ARGS,
+        "-c:a", "copy",
+        "-movflags", "+faststart",
+        "-threads", str(PROXY_THREADS),
+        str(tmp),
+    ]
+    try:
+        await run_ffmpeg(cmd, "proxy", nice=10)
+        os.utime(tmp, ns=(mtime_ns, mtime_ns))
+        os.replace(tmp, dest)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+async def _build(filename: str) -> None:
+    try:
+        async with _slots:
+            if proxy_for(filename) is None and (SOURCES_DIR / filename).exists():
+                await build_proxy(filename)
+    except Exception as e:
+        # Previews fall back to the original; the next reindex retries
+        print(f"Proxy for {filename} failed: {e}")
+    finally:
+        _building.pop(filename, None)
+
+
+def schedule_proxies(filenames: list[str]) -> None:
+    """Build missing or stale proxies in the background, a few at a time."""
+    if not PROXIES:
+        return
+    for filename in filenames:
+        if filename not in _building and proxy_for(filename) is None:
+            _building[filename] = asyncio.create_task(_build(filename))
+
+
+async def wait_for_proxies() -> None:
+    """Return once no proxy is being built, including ones scheduled while waiting."""
+    while _building:
+        await asyncio.gather(*_building.values(), return_exceptions=True)
+
+
+def remove_proxy(filename: str) -> None:
+    if task := _building.pop(filename, None):
+        task.cancel()
+    proxy_path(filename).unlink(missing_ok=True)
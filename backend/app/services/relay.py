@@ -0,0 +1,31 @@
+import asyncio
+import time
+
+from app import events, state
+
+POLL_INTERVAL = 1.0
+
+
+async def relay_worker_updates() -> None:
+    """Publish changes made by out-of-process render workers to this process's event stream.
+
+    Workers only write to the database; while anyone is subscribed this polls
+    rows touched since the last poll and turns them into events.
+    """
+    since = time.time()
+    statuses: dict[str, str] = {}
+    while True:
+        await asyncio.sleep(POLL_INTERVAL)
+        if not events.has_subscribers():
+            since = time.time()
+            continue
+        for row in await state.changed_assemblies(since):
+            since = max(since, row["updated"])
+            if statuses.get(row["id"]) == row["status"] == "processing":
+                events.publish("progress", {k: row[k] for k in ("id", "progress", "fps", "speed", "eta", "stream_url")})
+            elif asm := await state.get_assembly(row["id"]):
+                events.publish("assembly", asm.model_dump())
+            if row["status"] in ("queued", "processing"):
+                statuses[row["id"]] = row["status"]
+            else:
+                statuses.pop(row["id"], None)
@@ -0,0 +1,184 @@
+import shutil
+from pathlib import Path
+
+from app.config import AUDIO_BITRATE, AUDIO_FADE_MS, FFMPEG_BIN, RELEASE_AUDIO, SOURCES_DIR
+from app.metrics import FFMPEG_SECONDS
+from app.services.cutter import AUDIO_ARGS, audio_fade_filter
+from app.services.ffmpeg import ProgressCallback, run_ffmpeg
+from app.services.packet_index import PacketIndex, get_packet_index
+from app.services.probe import ffprobe
+
+# Only AAC-LC is re-encoded into fade windows; anything else falls back to encoding the whole clip
+SPLICE_CODECS = {"aac"}
+AAC_FRAME = 1024
+# Frames each window is encoded past its seam and then dropped, so the encoder's window state at
+# the seam is that of a continuous encode rather than a cold start
+PRE_ROLL_FRAMES = 2
+
+
+def _window_args(stream: dict) -> list[str]:
+    """Encode settings for a fade window that match the source track, so its packets splice onto copied ones.
+
+    Sample rate and channel layout carry over from the decoded source on their own.
+    """
+    bitrate = stream.get("bit_rate")
+    return ["-c:a", stream["codec_name"], "-b:a", bitrate if bitrate and bitrate.isdigit() else AUDIO_BITRATE]
+
+
+async def _extract(input_path: str, start: float, end: float, out: Path, args: list[str]) -> None:
+    # Seeking a stream copy lands on the video keyframe and keeps the audio packets from there at
+    # negative timestamps; trimming again on the output side drops them
+    trim = ["-ss", "0", "-t", str(end - start)] if "copy" in args else ["-t", str(end - start)]
+    await run_ffmpeg([
+        FFMPEG_BIN, "-nostdin", "-y",
+        "-ss", str(start), "-i", input_path,
+        *trim,
+        "-map", "0:a:0", "-vn", *args,
+        str(out),
+    ], "release audio")
+
+
+async def _encode_window(
+    input_path: str, origin: int, rate: int, first: int, last: int, fade: str, drop: str, out: Path, args: list[str],
+) -> None:
+    """Encode source samples [first, last) with ``fade`` as ADTS, minus the packets ``drop`` matches.
+
+    ``drop`` sees packet pts in samples from ``first``, the encoder's priming packet being at -1024.
+    ``origin`` is the source's start_time in samples, which -copyts keeps on the decoded audio.
+    """
+    await run_ffmpeg([
+        FFMPEG_BIN, "-nostdin", "-y",
+        # Decoding from a frame early gives the decoder the overlap for the first sample kept
+        "-ss", str(max(0.0, (first - AAC_FRAME) / rate - 0.05)), "-copyts", "-i", input_path,
+        "-map", "0:a:0", "-vn",
+        "-af", f"atrim=start_pts={origin + first}:end_pts={origin + last},asetpts=PTS-STARTPTS,{fade}",
+        *args,
+        "-bsf:a", f"noise=drop={drop}",
+        "-f", "adts", str(out),
+    ], "release audio")
+
+
+def _splice_plan(index: PacketIndex, rate: int, start: float, end: float, fade: float) -> dict | None:
+    """Sample positions of a splice of [start, end], or None when the clip has no copyable interior.
+
+    Source packets from ``head_end`` (the first packet boundary after the fade-in) up to ``tail_start``
+    (the last one before the fade-out) are copied. The head window is encoded from ``head_from``, the
+    packet boundary at or before start, and the tail window from PRE_ROLL_FRAMES before ``tail_start``.
+    """
+    head_end = index.snap_audio(start + fade, "after")
+    tail_start = index.snap_audio(end - fade, "before")
+    if head_end is None or tail_start is None or not start < head_end < tail_start < end:
+        return None
+    s, e, h, t = (round(x * rate) for x in (start, end, head_end, tail_start))
+    # Copied packets must be whole frames, and the tail's pre-roll must still be inside the source
+    if (t - h) % AAC_FRAME or t < PRE_ROLL_FRAMES * AAC_FRAME:
+        return None
+    return {
+        "start": s, "end": e, "fade": round(fade * rate),
+        "head_end": h, "tail_start": t,
+        "head_from": h + (s - h) // AAC_FRAME * AAC_FRAME,
+        "tail_from": t - PRE_ROLL_FRAMES * AAC_FRAME,
+    }
+
+
+async def render_release_audio(filename: str, start: float, end: float, output: Path) -> None:
+    """Audio of a release clip as .m4a, per RELEASE_AUDIO.
+
+    "encode" re-encodes all of it with the fades, "copy" stream-copies it without fades, and
+    "splice" stream-copies everything between the first audio packet after the fade-in and the
+    last one before the fade-out, re-encoding only those two windows. Sources whose audio can't
+    be spliced, or clips too short to have an interior, are encoded.
+    """
+    input_path = str(SOURCES_DIR / filename)
+    fade = AUDIO_FADE_MS / 1000.0
+    mode = RELEASE_AUDIO
+    if mode == "copy":
+        with FFMPEG_SECONDS.time(op="release_audio", mode="copy", codec="copy"):
+            await _extract(input_path, start, end, output, ["-c:a", "copy"])
+        return
+
+    plan = None
+    if mode == "splice":
+        data = await ffprobe(input_path)
+        stream = next((s for s in data.get("streams", []) if s["codec_type"] == "audio"), None)
+        rate = int(stream.get("sample_rate") or 0) if stream else 0
+        if rate and stream.get("codec_name") in SPLICE_CODECS and stream.get("profile") == "LC":
+            plan = _splice_plan(await get_packet_index(filename), rate, start, end, fade)
+    if plan is None:
+        with FFMPEG_SECONDS.time(op="release_audio", mode="encode", codec=AUDIO_ARGS[1]):
+            await _extract(input_path, start, end, output, ["-af", audio_fade_filter(end - start), *AUDIO_ARGS])
+        return
+
+    parts_dir = output.with_name(output.stem + ".audio")
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        window = _window_args(stream)
+        origin = round(float(data.get("format", {}).get("start_time", 0) or 0) * rate)
+        s, e, f = plan["start"], plan["end"], plan["fade"]
+        h, t, a, b = plan["head_end"], plan["tail_start"], plan["head_from"], plan["tail_from"]
+        head, middle, tail = parts_dir / "head.aac", parts_dir / "middle.aac", parts_dir / "tail.aac"
+        with FFMPEG_SECONDS.time(op="release_audio", mode="splice", codec=stream["codec_name"]):
+            await _encode_window(
+                input_path, origin, rate, a, h + PRE_ROLL_FRAMES * AAC_FRAME,
+                f"afade=t=in:start_sample={s - a}:nb_samples={f}",
+                f"gte(pts\\,{h - a})", head, window,
+            )
+            # Stop half a packet short of tail_start so the -t cut can't take in the packet there
+            await _extract(input_path, h / rate, (t - AAC_FRAME / 2) / rate, middle, ["-c:a", "copy", "-f", "adts"])
+            await _encode_window(
+                input_path, origin, rate, b, e,
+                f"afade=t=out:start_sample={e - f - b}:nb_samples={f}",
+                f"lt(pts\\,{t - b})", tail, window,
+            )
+            # ADTS carries no timestamps, so the joined packets count up from the head's priming packet.
+            # Shifting them puts the priming and everything before start below zero, where the mp4 edit
+            # list hides it, and the last packet is cut at end instead of running on into the encoder's padding
+            tail_frames = -(-(e - t) // AAC_FRAME)
+            count = 1 + (t - a) // AAC_FRAME + tail_frames
+            last = e - t - (tail_frames - 1) * AAC_FRAME
+            await run_ffmpeg([
+                FFMPEG_BIN, "-nostdin", "-y",
+                "-i", "concat:" + "|".join(str(p) for p in (head, middle, tail)),
+                "-c", "copy",
+                "-bsf:a", f"setts=ts=TS-{s - a + AAC_FRAME}/(TB*SR)"
+                f":duration=if(eq(N\\,{count - 1})\\,{last}/(TB*SR)\\,DURATION)",
+                str(output),
+            ], "release audio splice")
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+
+async def copy_cut(
+    filename: str,
+    start: float,
+    end: float,
+    output_path: Path,
+    on_progress: ProgressCallback | None = None,
+) -> None:
+    """Release cut with stream-copied video, like cut_segment's, but audio from render_release_audio."""
+    input_path = str(SOURCES_DIR / filename)
+    data = await ffprobe(input_path)
+    audio = None
+    if not any(s["codec_type"] == "audio" for s in data.get("streams", [])):
+        cmd = [
+            FFMPEG_BIN, "-nostdin", "-y",
+            "-ss", str(start), "-to", str(end), "-i", input_path,
+            "-c:v", "copy",
+            str(output_path),
+        ]
+    else:
+        audio = output_path.with_name(output_path.stem + ".audio.m4a")
+        await render_release_audio(filename, start, end, audio)
+        cmd = [
+            FFMPEG_BIN, "-nostdin", "-y",
+            "-ss", str(start), "-to", str(end), "-i", input_path,
+            "-i", str(audio),
+            "-map", "0:v:0", "-map", "1:a:0", "-c", "copy",
+            str(output_path),
+        ]
+    try:
+        with FFMPEG_SECONDS.time(op="cut", mode="release", codec="copy"):
+            await run_ffmpeg(cmd, "cut", on_progress)
+    finally:
+        if audio:
+            audio.unlink(missing_ok=True)
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from app import events, state
+from app.config import (
+    ASSEMBLY_PRIORITY,
+    MAX_CONCURRENT_ASSEMBLIES,
+    MAX_JOB_ATTEMPTS,
+    WORKER_HEARTBEAT_INTERVAL,
+    WORKER_TIMEOUT,
+)
+from app.models.assembly import Assembly
+from app.services.assembly import run_assembly
+from app.services.storage import ensure_room
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+# Fallback poll for jobs queued by other processes or a missed wake-up
+POLL_INTERVAL = 2.0
+
+
+def job_priority(asm: Assembly) -> int:
+    return int(asm.preview == (ASSEMBLY_PRIORITY == "preview"))
+
+
+class Scheduler:
+    """Runs queued assemblies from the jobs table, at most ``max_running`` at a time.
+
+    Any number of schedulers (the API's embedded one and ``app.worker``
+    processes) can share a database: claims are atomic, running jobs are
+    heartbeated, and jobs of workers that stop heartbeating are re-queued.
+    """
+
+    def __init__(self, max_running: int, worker_id: str = WORKER_ID):
+        self.max_running = max_running
+        self.worker_id = worker_id
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._starved = False
+
+    async def start(self) -> None:
+        await self._recover(startup=True)
+        self._tasks = [asyncio.create_task(self._loop()), asyncio.create_task(self._heartbeat())]
+
+    async def stop(self) -> None:
+        tasks = [*self._tasks, *state.assembly_tasks.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        state.assembly_tasks.clear()
+        await state.release_jobs(self.worker_id)
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def enqueue(self, asms: list[Assembly]) -> None:
+        """Assign ids to new assemblies and queue them together."""
+        await state.queue_assemblies(asms, [job_priority(asm) for asm in asms])
+        self.wake()
+
+    async def _recover(self, startup: bool = False) -> None:
+        _, failed = await state.recover_jobs(
+            MAX_JOB_ATTEMPTS, time.time() - WORKER_TIMEOUT, self.worker_id if startup else None,
+        )
+        for asm_id in failed:
+            if asm := await state.get_assembly(asm_id):
+                events.publish("assembly", asm.model_dump())
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+            # A failed beat is retried on the next one; the loop itself must outlive any error
+            try:
+                owned = await state.heartbeat_jobs(self.worker_id, list(state.assembly_tasks))
+                for asm_id, task in list(state.assembly_tasks.items()):
+                    if asm_id not in owned:
+                        # Deleted (or reassigned) while we were rendering it
+                        task.cancel()
+                await self._recover()
+            except Exception:
+                logger.exception("Worker %s: heartbeat failed", self.worker_id)
+
+    async def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                await self._claim()
+            except Exception:
+                logger.exception("Worker %s: claiming jobs failed", self.worker_id)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self) -> None:
+        while len(state.assembly_tasks) < self.max_running:
+            # Space is only reclaimed to admit a job, never just because the volume is low
+            if not await state.has_queued_jobs():
+                return
+            # Leave jobs queued rather than have ffmpeg run out of disk halfway through a write
+            if not await ensure_room():
+                if not self._starved:
+                    logger.warning("Worker %s: media volume below MIN_FREE_BYTES, holding queued jobs", self.worker_id)
+                self._starved = True
+                return
+            self._starved = False
+            asm_id = await state.claim_job(self.worker_id)
+            if asm_id is None:
+                return
+            asm = None
+            if await state.set_assembly_status(asm_id, "processing"):
+                asm = await state.get_assembly(asm_id)
+            if asm is None:
+                # Deleted between the claim and here
+                await state.finish_job(asm_id)
+                continue
+            events.publish("assembly", asm.model_dump())
+            state.assembly_tasks[asm.id] = asyncio.create_task(self._run(asm))
+
+    async def _run(self, asm: Assembly) -> None:
+        try:
+            await run_assembly(asm, self.worker_id)
+        finally:
+            state.assembly_tasks.pop(asm.id, None)
+            self.wake()
+
+
+scheduler = Scheduler(MAX_CONCURRENT_ASSEMBLIES)
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import shutil
+from pathlib import Path
+
+from app.config import SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES
+
+
+def _link(src: Path, dest: Path) -> None:
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class SegmentCache:
+    """Content-addressed store of cut segments, evicted least-recently-used first.
+
+    Entries are hard-linked into assembly directories, so evicting one never
+    breaks an existing result. Recency is the file mtime, bumped on every hit.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def _path(self, key: str, ext: str) -> Path:
+        return self.root / key[:2] / f"{key}{ext}"
+
+    def lock(self, key: str) -> asyncio.Lock:
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    def fetch(self, key: str, dest: Path) -> bool:
+        path = self._path(key, dest.suffix)
+        try:
+            os.utime(path)
+            _link(path, dest)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key: str, src: Path) -> None:
+        path = self._path(key, src.suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        _link(src, tmp)
+        tmp.replace(path)
+        self._locks.pop(key, None)
+        self.evict()
+
+    def _entries(self) -> list[tuple[float, int, int, Path]]:
+        """(mtime, size, link count, path) of every entry, least recently used first."""
+        entries = []
+        for p in self.root.glob("*/*"):
+            if p.name.endswith(".tmp"):
+                continue
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, st.st_nlink, p))
+        return sorted(entries)
+
+    def evict(self) -> None:
+        entries = self._entries()
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, _, p in entries:
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+
+    def trim(self, nbytes: int) -> int:
+        """Evict least recently used entries until ``nbytes`` of disk is freed; returns the bytes freed.
+
+        Entries still linked into an assembly directory free nothing, so they are kept.
+        """
+        freed = 0
+        for _, size, links, p in self._entries():
+            if freed >= nbytes:
+                break
+            if links > 1:
+                continue
+            p.unlink(missing_ok=True)
+            freed += size
+            self.evictions += 1
+        return freed
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+segment_cache = SegmentCache(SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES)
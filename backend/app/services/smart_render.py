@@ -0,0 +1,120 @@
+import shutil
+from fractions import Fraction
+from pathlib import Path
+
+from app.config import FFMPEG_BIN, SOURCES_DIR
+from app.metrics import FFMPEG_SECONDS
+from app.services.ffmpeg import ProgressCallback, run_ffmpeg
+from app.services.packet_index import get_packet_index
+from app.services.probe import ffprobe
+from app.services.release_audio import render_release_audio
+
+# Source codec -> encoder able to produce a bitstream that splices with it
+ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+PROFILES = {
+    "Baseline": "baseline", "Constrained Baseline": "baseline", "Main": "main", "High": "high", "High 10": "high10",
+}
+BOUNDARY_QUALITY = ["-preset", "medium", "-crf", "16"]
+
+
+def _offset(on_progress: ProgressCallback | None, offset: float) -> ProgressCallback | None:
+    if on_progress is None:
+        return None
+
+    async def shifted(info: dict) -> None:
+        if info["out_time"] is not None:
+            info = {**info, "out_time": info["out_time"] + offset}
+        await on_progress(info)
+    return shifted
+
+
+def _encoder_args(stream: dict, encoder: str) -> list[str]:
+    """Encode settings matching the source stream closely enough to stream-copy alongside it."""
+    args = ["-c:v", encoder, *BOUNDARY_QUALITY, "-pix_fmt", stream.get("pix_fmt", "yuv420p")]
+    if profile := PROFILES.get(stream.get("profile", "")):
+        args += ["-profile:v", profile]
+    # Keep the source's frame timestamps: forcing a rate would add or drop frames of variable rate footage
+    args += ["-fps_mode", "passthrough"]
+    if time_base := stream.get("time_base"):
+        args += ["-video_track_timescale", str(Fraction(time_base).denominator)]
+    return args
+
+
+async def _encode_video(input_path: str, start: float, end: float, out: Path, encoder_args: list[str],
+                        on_progress: ProgressCallback | None) -> None:
+    cmd = [
+        FFMPEG_BIN, "-nostdin", "-y",
+        "-ss", str(start), "-i", input_path, "-t", str(end - start),
+        "-map", "0:v:0", "-an", *encoder_args,
+        str(out),
+    ]
+    with FFMPEG_SECONDS.time(op="smart_encode", mode="release", codec=encoder_args[1]):
+        await run_ffmpeg(cmd, "smart render encode", on_progress, threads=0)
+
+
+async def _copy_video(input_path: str, start: float, end: float, out: Path,
+                      on_progress: ProgressCallback | None) -> None:
+    # start is a keyframe, so the input seek lands exactly on it
+    cmd = [
+        FFMPEG_BIN, "-nostdin", "-y",
+        "-ss", str(start), "-i", input_path, "-t", str(end - start),
+        "-map", "0:v:0", "-an", "-c:v", "copy",
+        str(out),
+    ]
+    with FFMPEG_SECONDS.time(op="smart_copy", mode="release", codec="copy"):
+        await run_ffmpeg(cmd, "smart render copy", on_progress)
+
+
+async def smart_cut(
+    filename: str,
+    start: float,
+    end: float,
+    output_path: Path,
+    on_progress: ProgressCallback | None = None,
+) -> None:
+    """Frame-accurate cut that stream-copies whole GOPs and re-encodes only the partial ones at the edges."""
+    input_path = str(SOURCES_DIR / filename)
+    data = await ffprobe(input_path)
+    stream = next(s for s in data["streams"] if s["codec_type"] == "video")
+    encoder = ENCODERS.get(stream["codec_name"], "libx264")
+    encoder_args = _encoder_args(stream, encoder)
+    index = await get_packet_index(filename)
+    span = index.interior(start, end)
+    if stream["codec_name"] not in ENCODERS:
+        span = None  # can't splice a re-encoded boundary into this codec
+
+    parts_dir = output_path.with_name(output_path.stem + ".parts")
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        # MPEG-TS parts carry parameter sets in-band, so differing SPS/PPS survive the concat
+        parts: list[Path] = []
+        if span is None:
+            parts.append(parts_dir / "all.ts")
+            await _encode_video(input_path, start, end, parts[-1], encoder_args, on_progress)
+        else:
+            k1, k2 = index.keyframes[span[0]], index.keyframes[span[1]]
+            if k1 > start:
+                parts.append(parts_dir / "head.ts")
+                await _encode_video(input_path, start, k1, parts[-1], encoder_args, on_progress)
+            parts.append(parts_dir / "middle.ts")
+            await _copy_video(input_path, k1, k2, parts[-1], _offset(on_progress, k1 - start))
+            if end > k2:
+                parts.append(parts_dir / "tail.ts")
+                await _encode_video(input_path, k2, end, parts[-1], encoder_args, _offset(on_progress, k2 - start))
+
+        list_file = parts_dir / "parts.txt"
+        list_file.write_text("\n".join(f"file '{p.resolve()}'" for p in parts))
+        inputs, maps = ["-f", "concat", "-safe", "0", "-i", str(list_file)], ["-map", "0:v"]
+        if any(s["codec_type"] == "audio" for s in data["streams"]):
+            audio = parts_dir / "audio.m4a"
+            await render_release_audio(filename, start, end, audio)
+            inputs += ["-i", str(audio)]
+            maps += ["-map", "1:a"]
+        await run_ffmpeg([
+            FFMPEG_BIN, "-nostdin", "-y",
+            *inputs,
+            *maps, "-c", "copy",
+            str(output_path),
+        ], "smart render mux")
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from app import events, state
+from app.config import (
+    KEEP_INTERMEDIATES,
+    MEDIA_DIR,
+    MEDIA_QUOTA_BYTES,
+    MIN_FREE_BYTES,
+    PREVIEW_TTL_DAYS,
+    PREVIEWS_DIR,
+    PROXIES_DIR,
+    SEGMENT_CACHE_DIR,
+    STORAGE_GC_INTERVAL,
+    THUMBNAILS_DIR,
+    WAVEFORMS_DIR,
+)
+from app.services.segment_cache import segment_cache
+
+logger = logging.getLogger(__name__)
+
+# Everything else directly under media/ is an assembly's directory
+_SERVICE_DIRS = {p.name for p in (PREVIEWS_DIR, PROXIES_DIR, THUMBNAILS_DIR, WAVEFORMS_DIR, SEGMENT_CACHE_DIR)}
+# A directory with no assembly row is left alone this long, in case the row is still being written
+_ORPHAN_GRACE = 60.0
+
+
+def remove_assembly_media(asm_id: str) -> None:
+    shutil.rmtree(MEDIA_DIR / asm_id, ignore_errors=True)
+
+
+def remove_intermediates(asm_dir: Path) -> None:
+    """Drop what the segments engine leaves next to result.mp4: cut segments, concat list and HLS playlist."""
+    shutil.rmtree(asm_dir / "segments", ignore_errors=True)
+    for name in ("concat_list.txt", "index.m3u8"):
+        (asm_dir / name).unlink(missing_ok=True)
+
+
+def _tree_bytes(path: Path, freed_only: bool = False) -> int:
+    # Cached segments are hard-linked into assembly dirs; count each inode once, and with
+    # freed_only just the ones whose last link is here
+    sizes = {}
+    for f in path.rglob("*"):
+        try:
+            st = f.lstat()
+        except FileNotFoundError:
+            continue
+        if f.is_file() and (not freed_only or st.st_nlink == 1):
+            sizes[st.st_ino] = st.st_size
+    return sum(sizes.values())
+
+
+def free_bytes() -> int:
+    return shutil.disk_usage(MEDIA_DIR).free
+
+
+async def usage() -> dict:
+    return {
+        "media_bytes": await asyncio.to_thread(_tree_bytes, MEDIA_DIR),
+        "free_bytes": free_bytes(),
+        "quota_bytes": MEDIA_QUOTA_BYTES,
+        "min_free_bytes": MIN_FREE_BYTES,
+    }
+
+
+async def _delete(asm_id: str, why: str) -> None:
+    if await state.delete_assembly(asm_id):
+        events.publish("deleted", {"id": asm_id})
+    await asyncio.to_thread(remove_assembly_media, asm_id)
+    logger.info("Storage: removed %s (%s)", asm_id, why)
+
+
+async def reclaim(media_bytes: int | None = None) -> dict:
+    """Free space until media/ is within quota and MIN_FREE_BYTES is free.
+
+    Unused segment cache entries go first, least recently used first, then finished previews,
+    oldest first: nginx serves previews straight from disk, so there is no last access to go by.
+    Proxies, thumbnails, waveforms and releases are never reclaimed, so previews are only evicted
+    if that is enough; when even all of them wouldn't be, they are kept and the remaining
+    shortfall is reported.
+    """
+    if MEDIA_QUOTA_BYTES and media_bytes is None:
+        media_bytes = await asyncio.to_thread(_tree_bytes, MEDIA_DIR)
+
+    def shortfall() -> int:
+        over_quota = media_bytes - MEDIA_QUOTA_BYTES if MEDIA_QUOTA_BYTES else 0
+        return max(over_quota, MIN_FREE_BYTES - free_bytes(), 0)
+
+    result = {"cache_bytes": 0, "evicted": 0, "short_bytes": shortfall()}
+    if not result["short_bytes"]:
+        return result
+    result["cache_bytes"] = await asyncio.to_thread(segment_cache.trim, result["short_bytes"])
+    if media_bytes is not None:
+        media_bytes -= result["cache_bytes"]
+    result["short_bytes"] = shortfall()
+    if not result["short_bytes"]:
+        return result
+
+    previews = [
+        (asm_id, await asyncio.to_thread(_tree_bytes, MEDIA_DIR / asm_id, True))
+        for asm_id in await state.finished_previews()
+    ]
+    if sum(freed for _, freed in previews) < result["short_bytes"]:
+        return result
+    for asm_id, freed in previews:
+        if shortfall() <= 0:
+            break
+        await _delete(asm_id, "evicted")
+        if media_bytes is not None:
+            media_bytes -= freed
+        result["evicted"] += 1
+    result["short_bytes"] = shortfall()
+    return result
+
+
+async def ensure_room() -> bool:
+    """Admission check before claiming a job: reclaim space if it is short, then say whether that sufficed."""
+    if free_bytes() >= MIN_FREE_BYTES:
+        return True
+    await reclaim()
+    return free_bytes() >= MIN_FREE_BYTES
+
+
+async def collect_garbage() -> dict:
+    """Reclaim directories of deleted assemblies, expired previews and stale intermediates, then enforce the quota."""
+    dirs = [d for d in MEDIA_DIR.iterdir() if d.is_dir() and d.name not in _SERVICE_DIRS]
+    ids = await state.assembly_ids()
+    orphans = 0
+    for d in dirs:
+        if d.name not in ids and time.time() - d.stat().st_mtime > _ORPHAN_GRACE:
+            await asyncio.to_thread(shutil.rmtree, d, True)
+            orphans += 1
+
+    expired = 0
+    if PREVIEW_TTL_DAYS:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=PREVIEW_TTL_DAYS)).isoformat()
+        for asm_id in await state.finished_previews(created_before=cutoff):
+            await _delete(asm_id, "expired")
+            expired += 1
+
+    # Finished before intermediates were dropped on success, or with KEEP_INTERMEDIATES since unset
+    if not KEEP_INTERMEDIATES:
+        for asm in await state.list_assemblies(status="done", include_clips=False):
+            if (MEDIA_DIR / asm.id / "segments").exists():
+                await asyncio.to_thread(remove_intermediates, MEDIA_DIR / asm.id)
+
+    return {"orphans": orphans, "expired": expired, **await reclaim()}
+
+
+async def run_storage_gc() -> None:
+    while True:
+        try:
+            result = await collect_garbage()
+            if result["short_bytes"]:
+                logger.warning("Storage GC: still %d bytes over the limits after %s", result["short_bytes"], result)
+            elif any(result.values()):
+                logger.info("Storage GC: %s", result)
+        except Exception:
+            logger.exception("Storage GC failed")
+        await asyncio.sleep(STORAGE_GC_INTERVAL)
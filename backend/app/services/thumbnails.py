@@ -0,0 +1,137 @@
+import asyncio
+import json
+import math
+import os
+import shutil
+from pathlib import Path
+from urllib.parse import quote
+
+from app.config import (
+    FFMPEG_BIN,
+    MEDIA_DIR,
+    PREVIEWS_DIR,
+    SOURCES_DIR,
+    SPRITE_COLUMNS,
+    SPRITE_INTERVAL,
+    SPRITE_MAX_THUMBS,
+    SPRITE_ROWS,
+    SPRITE_THUMB_WIDTH,
+    THUMBNAILS_DIR,
+)
+from app.services.ffmpeg import run_ffmpeg
+
+# Per source; a second build of the same file would delete the first one's output as it is written
+_locks: dict[str, asyncio.Lock] = {}
+
+
+def poster_path(filename: str) -> Path:
+    return PREVIEWS_DIR / (Path(filename).stem + ".jpg")
+
+
+def _thumbs_dir(filename: str) -> Path:
+    return THUMBNAILS_DIR / filename
+
+
+def _url(path: Path) -> str:
+    return "/media/" + quote(path.relative_to(MEDIA_DIR).as_posix())
+
+
+def thumbnail_info(filename: str) -> dict | None:
+    """Sprite sheet layout of a source, or None when missing or built from an older version of the file."""
+    meta = _thumbs_dir(filename) / "thumbs.json"
+    try:
+        # Stamped with the source's mtime when written, like proxies
+        if meta.stat().st_mtime_ns != (SOURCES_DIR / filename).stat().st_mtime_ns:
+            return None
+        return json.loads(meta.read_text())
+    except FileNotFoundError:
+        return None
+
+
+def _thumb_size(resolution: str) -> tuple[int, int]:
+    try:
+        width, height = (int(v) for v in resolution.split("x"))
+    except ValueError:
+        width, height = 16, 9
+    return SPRITE_THUMB_WIDTH, max(2, round(SPRITE_THUMB_WIDTH * height / width / 2) * 2)
+
+
+def _vtt_time(t: float) -> str:
+    ms = round(t * 1000)
+    return f"{ms // 3_600_000:02d}:{ms // 60_000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}"
+
+
+async def generate_thumbnails(filename: str, duration: float, resolution: str) -> dict:
+    """Poster frame, tiled sprite sheets and a WebVTT thumbnail track from one keyframe-only decode."""
+    async with _locks.setdefault(filename, asyncio.Lock()):
+        return await _generate(filename, duration, resolution)
+
+
+async def get_thumbnails(filename: str, duration: float, resolution: str) -> dict:
+    """Current thumbnails of a source, built now if missing, or after a build already under way."""
+    async with _locks.setdefault(filename, asyncio.Lock()):
+        return thumbnail_info(filename) or await _generate(filename, duration, resolution)
+
+
+async def _generate(filename: str, duration: float, resolution: str) -> dict:
+    source = SOURCES_DIR / filename
+    mtime_ns = source.stat().st_mtime_ns
+    interval = max(SPRITE_INTERVAL, duration / SPRITE_MAX_THUMBS)
+    count = max(1, math.ceil(duration / interval))
+    span = count * interval
+    width, height = _thumb_size(resolution)
+    per_sheet = SPRITE_COLUMNS * SPRITE_ROWS
+
+    out_dir = _thumbs_dir(filename)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    out_dir.mkdir(parents=True)
+    PREVIEWS_DIR.mkdir(parents=True, exist_ok=True)
+    # Only keyframes are decoded for the sprites, so each thumbnail is the last keyframe at or before its
+    # slot. Cloning the last frame and trimming to count * interval makes fps emit exactly `count` frames.
+    # The poster is the frame at 0.5 s, so it comes from a second, fully decoded input seeked there.
+    graph = (
+        f"[1:v]scale=320:-2[poster];"
+        f"[0:v]tpad=stop_mode=clone:stop_duration={span},trim=end={span},fps=1/{interval},"
+        f"scale={width}:{height},tile={SPRITE_COLUMNS}x{SPRITE_ROWS}[sprite]"
+    )
+    cmd = [
+        FFMPEG_BIN, "-nostdin", "-y",
+        "-skip_frame", "nokey",
+        "-i", str(source),
+        "-ss", str(min(0.5, duration / 2)),
+        "-i", str(source),
+        "-filter_complex", graph,
+        "-map", "[poster]", "-frames:v", "1", str(poster_path(filename)),
+        "-map", "[sprite]", "-fps_mode", "passthrough", str(out_dir / "sprite_%03d.jpg"),
+    ]
+    await run_ffmpeg(cmd, "thumbnails")
+
+    sheets = [out_dir / f"sprite_{i + 1:03d}.jpg" for i in range(math.ceil(count / per_sheet))]
+    cues = ["WEBVTT", ""]
+    for i in range(count):
+        col, row = i % per_sheet % SPRITE_COLUMNS, i % per_sheet // SPRITE_COLUMNS
+        cues += [
+            f"{_vtt_time(i * interval)} --> {_vtt_time(min((i + 1) * interval, duration))}",
+            f"{sheets[i // per_sheet].name}#xywh={col * width},{row * height},{width},{height}",
+            "",
+        ]
+    (out_dir / "thumbs.vtt").write_text("\n".join(cues))
+    info = {
+        "poster": _url(poster_path(filename)),
+        "vtt": _url(out_dir / "thumbs.vtt"),
+        "sprites": [_url(sheet) for sheet in sheets],
+        "interval": interval,
+        "count": count,
+        "columns": SPRITE_COLUMNS,
+        "rows": SPRITE_ROWS,
+        "width": width,
+        "height": height,
+    }
+    meta = out_dir / "thumbs.json"
+    meta.write_text(json.dumps(info))
+    os.utime(meta, ns=(mtime_ns, mtime_ns))
+    return info
+
+
+def remove_thumbnails(filename: str) -> None:
+    shutil.rmtree(_thumbs_dir(filename), ignore_errors=True)
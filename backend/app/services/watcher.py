@@ -0,0 +1,69 @@
+import asyncio
+from pathlib import Path
+
+from watchfiles import awatch
+
+from app import events
+from app.config import SOURCE_STABLE_SECONDS, SOURCES_DIR, WATCH_DEBOUNCE, WATCH_POLLING
+from app.services.indexer import EXTENSIONS, reindex_sources
+
+
+def _sizes(paths: set[Path]) -> dict[Path, int | None]:
+    sizes = {}
+    for p in paths:
+        try:
+            sizes[p] = p.stat().st_size
+        except FileNotFoundError:
+            sizes[p] = None
+    return sizes
+
+
+async def _wait_until_stable(paths: set[Path]) -> None:
+    """Return once none of ``paths`` has changed size for SOURCE_STABLE_SECONDS."""
+    sizes = _sizes(paths)
+    while True:
+        await asyncio.sleep(SOURCE_STABLE_SECONDS)
+        now = _sizes(paths)
+        if now == sizes:
+            return
+        sizes = now
+
+
+async def _watch(stop: asyncio.Event, force_polling: bool) -> None:
+    async for changes in awatch(
+        SOURCES_DIR,
+        recursive=False,
+        debounce=int(WATCH_DEBOUNCE * 1000),
+        force_polling=force_polling,
+        stop_event=stop,
+    ):
+        paths = {Path(p) for _, p in changes if Path(p).suffix.lower() in EXTENSIONS}
+        if not paths:
+            continue
+        # Files still being copied in would be probed half-written
+        await _wait_until_stable(paths)
+        try:
+            # Only new or modified files get probed; the rest is a directory listing
+            count = await reindex_sources()
+        except Exception as e:
+            print(f"Reindex after source changes failed: {e}")
+            continue
+        print(f"Sources changed ({', '.join(sorted(p.name for p in paths))}), {count} indexed")
+        events.publish("sources", {"count": count})
+
+
+async def watch_sources(stop: asyncio.Event) -> None:
+    """Keep the source index in step with SOURCES_DIR, via inotify or, failing that, polling, until ``stop`` is set.
+
+    Stop it with ``stop`` rather than by cancelling: awatch's notify thread only winds down once it sees the
+    event, and a cancelled awatch returns without waiting for that, leaving the thread to outlive the loop.
+    """
+    SOURCES_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        await _watch(stop, WATCH_POLLING)
+    except OSError as e:
+        if WATCH_POLLING:
+            raise
+        # No inotify, or out of watches
+        print(f"Watching {SOURCES_DIR} failed ({e}), polling instead")
+        await _watch(stop, True)
@@ -0,0 +1,204 @@
+import math
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from app.config import (
+    FFMPEG_BIN,
+    SILENCE_SNAP_WINDOW,
+    SILENCE_THRESHOLD_DB,
+    SOURCES_DIR,
+    WAVEFORM_BUCKET_SAMPLES,
+    WAVEFORM_SAMPLE_RATE,
+    WAVEFORMS_DIR,
+)
+from app.services.ffmpeg import run_ffmpeg
+from app.services.packet_index import get_packet_index
+
+# magic, sample rate, samples per finest bucket, total samples, level count
+_HEADER = struct.Struct("<4sIIQI")
+_MAGIC = b"KWF1"
+# Levels halve until they are this short
+_MIN_LEVEL = 64
+_FULL_SCALE = 32768
+
+
+class _Accumulator:
+    """Folds s16le mono PCM into per-bucket peak and RMS as ffmpeg writes it, so no full decode is held."""
+
+    def __init__(self, bucket: int):
+        self.bucket = bucket
+        self.pending = b""
+        self.samples = 0
+        self.peaks: list[np.ndarray] = []
+        self.rms: list[np.ndarray] = []
+
+    def feed(self, chunk: bytes) -> None:
+        data = self.pending + chunk
+        usable = len(data) // (2 * self.bucket) * 2 * self.bucket
+        self.pending = data[usable:]
+        if usable:
+            self._add(np.frombuffer(data[:usable], "<i2").reshape(-1, self.bucket))
+
+    def finish(self) -> None:
+        if len(self.pending) >= 2:
+            self._add(np.frombuffer(self.pending[:len(self.pending) // 2 * 2], "<i2").reshape(1, -1))
+        self.pending = b""
+
+    def _add(self, frames: np.ndarray) -> None:
+        frames = frames.astype(np.int32)
+        self.samples += frames.size
+        self.peaks.append(np.abs(frames).max(axis=1))
+        self.rms.append(np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1)))
+
+
+def _halve(peaks: np.ndarray, rms: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    if len(peaks) % 2:
+        # Pair the odd one out with itself so the last bucket isn't diluted
+        peaks, rms = np.append(peaks, peaks[-1]), np.append(rms, rms[-1])
+    peaks = peaks.reshape(-1, 2).max(axis=1)
+    rms = np.sqrt(np.mean(np.square(rms.astype(np.float64)).reshape(-1, 2), axis=1))
+    return peaks, rms
+
+
+class Waveform:
+    """Peak and RMS amplitude of a source's audio, finest level first, each level half the length of the last.
+
+    Values are sample magnitudes (0..32768) stored as uint16.
+    """
+
+    def __init__(self, sample_rate: int, bucket: int, samples: int, levels: list[tuple[np.ndarray, np.ndarray]]):
+        self.sample_rate = sample_rate
+        self.bucket = bucket
+        self.samples = samples
+        self.levels = levels
+
+    @property
+    def duration(self) -> float:
+        return self.samples / self.sample_rate
+
+    @classmethod
+    def from_accumulator(cls, acc: _Accumulator, sample_rate: int) -> "Waveform":
+        peaks = np.concatenate(acc.peaks) if acc.peaks else np.zeros(0)
+        rms = np.concatenate(acc.rms) if acc.rms else np.zeros(0)
+        levels = [(peaks, rms)]
+        while len(peaks) > _MIN_LEVEL:
+            peaks, rms = _halve(peaks, rms)
+            levels.append((peaks, rms))
+        levels = [
+            (np.minimum(p, 65535).astype(np.uint16), np.rint(np.minimum(r, 65535)).astype(np.uint16))
+            for p, r in levels
+        ]
+        return cls(sample_rate, acc.bucket, acc.samples, levels)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Waveform":
+        magic, sample_rate, bucket, samples, count = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("not a waveform file")
+        offset, levels = _HEADER.size, []
+        length = math.ceil(samples / bucket)
+        for _ in range(count):
+            peaks = np.frombuffer(data, np.uint16, length, offset)
+            rms = np.frombuffer(data, np.uint16, length, offset + 2 * length)
+            levels.append((peaks, rms))
+            offset += 4 * length
+            length = math.ceil(length / 2)
+        return cls(sample_rate, bucket, samples, levels)
+
+    def to_bytes(self) -> bytes:
+        parts = [_HEADER.pack(_MAGIC, self.sample_rate, self.bucket, self.samples, len(self.levels))]
+        for peaks, rms in self.levels:
+            parts += [peaks.tobytes(), rms.tobytes()]
+        return b"".join(parts)
+
+    def resample(self, resolution: int) -> tuple[np.ndarray, np.ndarray]:
+        """``resolution`` peak/RMS pairs (0..1) over the whole source, or every finest bucket if there are fewer."""
+        # Coarsest level that still has enough buckets, then merge its buckets into even bins
+        peaks, rms = next(
+            (level for level in reversed(self.levels) if len(level[0]) >= resolution), self.levels[0]
+        )
+        if len(peaks) > resolution:
+            edges = np.linspace(0, len(peaks), resolution + 1).astype(np.int64)[:-1]
+            counts = np.diff(np.append(edges, len(peaks)))
+            peaks = np.maximum.reduceat(peaks, edges)
+            rms = np.sqrt(np.add.reduceat(np.square(rms.astype(np.float64)), edges) / counts)
+        return peaks / _FULL_SCALE, rms / _FULL_SCALE
+
+    def snap_silence(self, t: float, window: float = SILENCE_SNAP_WINDOW) -> float | None:
+        """Centre of the quiet bucket nearest ``t`` within ``window`` seconds, or None if it's loud throughout."""
+        _, rms = self.levels[0]
+        seconds = self.bucket / self.sample_rate
+        lo = max(0, int((t - window) / seconds))
+        hi = min(len(rms), int((t + window) / seconds) + 1)
+        if lo >= hi:
+            return None
+        threshold = _FULL_SCALE * 10 ** (SILENCE_THRESHOLD_DB / 20)
+        quiet = np.flatnonzero(rms[lo:hi] <= threshold)
+        if not len(quiet):
+            return None
+        centres = (lo + quiet + 0.5) * seconds
+        return round(float(centres[np.argmin(np.abs(centres - t))]), 3)
+
+
+def waveform_path(filename: str) -> Path:
+    return WAVEFORMS_DIR / (filename + ".wf")
+
+
+# filename -> (mtime_ns, waveform)
+_loaded: dict[str, tuple[int, Waveform]] = {}
+
+
+def waveform_current(filename: str) -> bool:
+    try:
+        return waveform_path(filename).stat().st_mtime_ns == (SOURCES_DIR / filename).stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+async def build_waveform(filename: str) -> Waveform:
+    """Decode a source's first audio stream once to mono PCM and store every level of its waveform."""
+    source = SOURCES_DIR / filename
+    mtime_ns = source.stat().st_mtime_ns
+    acc = _Accumulator(WAVEFORM_BUCKET_SAMPLES)
+    cmd = [
+        FFMPEG_BIN, "-nostdin", "-v", "error",
+        "-i", str(source),
+        "-map", "0:a:0", "-ac", "1", "-ar", str(WAVEFORM_SAMPLE_RATE),
+        "-f", "s16le", "pipe:1",
+    ]
+    await run_ffmpeg(cmd, "waveform", on_output=acc.feed)
+    acc.finish()
+    waveform = Waveform.from_accumulator(acc, WAVEFORM_SAMPLE_RATE)
+
+    path = waveform_path(filename)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(waveform.to_bytes())
+    # Stamped with the source's mtime, like proxies and thumbnails
+    os.utime(tmp, ns=(mtime_ns, mtime_ns))
+    os.replace(tmp, path)
+    _loaded[filename] = (mtime_ns, waveform)
+    return waveform
+
+
+async def get_waveform(filename: str) -> Waveform | None:
+    """Waveform for a source, decoded on first use; None when the source has no audio."""
+    mtime_ns = (SOURCES_DIR / filename).stat().st_mtime_ns
+    cached = _loaded.get(filename)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    if waveform_current(filename):
+        waveform = Waveform.from_bytes(waveform_path(filename).read_bytes())
+        _loaded[filename] = (mtime_ns, waveform)
+        return waveform
+    if not (await get_packet_index(filename)).audio:
+        return None
+    return await build_waveform(filename)
+
+
+def remove_waveform(filename: str) -> None:
+    _loaded.pop(filename, None)
+    waveform_path(filename).unlink(missing_ok=True)
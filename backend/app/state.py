@@ -1,6 +1,8 @@
 import asyncio
+import time
 
-from app.db import get_db
+from app.db import pool
+from app.metrics import timed_query
 from app.models.assembly import Assembly, ClipDetail
 from app.models.source import Source
 from app.models.tag import Tag
@@ -9,9 +11,9 @@ from app.models.tag import Tag
 assembly_tasks: dict[str, asyncio.Task] = {}
 
 
+@timed_query
 async def get_sources() -> list[Source]:
-    db = await get_db()
-    try:
+    async with pool.reader() as db:
         cursor = await db.execute(
             "SELECT idx, filename, duration, resolution, codec, file_size FROM sources ORDER BY idx"
         )
@@ -24,8 +26,6 @@ async def get_sources() -> list[Source]:
                    tags=tags_map.get(r["filename"], []))
             for r in rows
         ]
-    finally:
-        await db.close()
 
 
 async def _get_tags_for_filenames(db, filenames: list[str]) -> dict[str, list[dict]]:
@@ -43,166 +43,393 @@ async def _get_tags_for_filenames(db, filenames: list[str]) -> dict[str, list[di
     return result
 
 
-async def set_sources(sources: list[Source]) -> None:
-    db = await get_db()
-    try:
-        await db.execute("DELETE FROM sources")
-        for s in sources:
-            await db.execute(
-                "INSERT INTO sources (idx, filename, duration, resolution, codec, file_size) VALUES (?, ?, ?, ?, ?, ?)",
-                (s.index, s.filename, s.duration, s.resolution, s.codec, s.file_size),
-            )
-        await db.commit()
-    finally:
-        await db.close()
+@timed_query
+async def get_source_rows() -> dict[str, dict]:
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT idx, filename, duration, resolution, codec, file_size, mtime_ns FROM sources"
+        )
+        return {r["filename"]: dict(r) for r in await cursor.fetchall()}
+
+
+@timed_query
+async def sync_sources(upserts: list[tuple[Source, int]], removed: list[str]) -> None:
+    """Apply a reindex diff in one transaction. ``upserts`` pairs each source with its mtime_ns."""
+    async with pool.writer() as db:
+        await db.executemany("DELETE FROM sources WHERE filename = ?", [(f,) for f in removed])
+        await db.executemany("DELETE FROM packet_index WHERE filename = ?", [(f,) for f in removed])
+        await db.executemany(
+            """INSERT INTO sources (idx, filename, duration, resolution, codec, file_size, mtime_ns)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(filename) DO UPDATE SET
+                   idx = excluded.idx, duration = excluded.duration, resolution = excluded.resolution,
+                   codec = excluded.codec, file_size = excluded.file_size, mtime_ns = excluded.mtime_ns""",
+            [(s.index, s.filename, s.duration, s.resolution, s.codec, s.file_size, mtime_ns)
+             for s, mtime_ns in upserts],
+        )
 
 
-async def next_assembly_id() -> str:
-    db = await get_db()
-    try:
-        cursor = await db.execute("SELECT id FROM assemblies ORDER BY created DESC LIMIT 1")
+@timed_query
+async def get_packet_index(filename: str) -> dict | None:
+    async with pool.reader() as db:
+        cursor = await db.execute("SELECT * FROM packet_index WHERE filename = ?", (filename,))
         row = await cursor.fetchone()
-        if row:
-            last_num = int(row["id"].split("_")[1])
-            return f"asm_{last_num + 1:03d}"
-        return "asm_001"
-    finally:
-        await db.close()
+        return dict(row) if row else None
 
 
-async def save_assembly(asm: Assembly) -> None:
-    db = await get_db()
-    try:
+@timed_query
+async def get_packet_index_stamps() -> dict[str, tuple[int, int]]:
+    async with pool.reader() as db:
+        cursor = await db.execute("SELECT filename, file_size, mtime_ns FROM packet_index")
+        return {r["filename"]: (r["file_size"], r["mtime_ns"]) for r in await cursor.fetchall()}
+
+
+@timed_query
+async def save_packet_index(filename: str, file_size: int, mtime_ns: int, blobs: tuple[bytes, ...]) -> None:
+    async with pool.writer() as db:
         await db.execute(
-            """INSERT OR REPLACE INTO assemblies (id, name, status, error, preview, output_url, duration, note, created)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (asm.id, asm.name, asm.status, asm.error, int(asm.preview), asm.output_url, asm.duration, asm.note,
-             asm.created),
+            """INSERT OR REPLACE INTO packet_index (filename, file_size, mtime_ns, keyframes, offsets, gop_sizes, audio)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (filename, file_size, mtime_ns, *blobs),
         )
-        await db.execute("DELETE FROM clips WHERE assembly_id = ?", (asm.id,))
-        for clip in asm.clips:
-            await db.execute(
-                "INSERT INTO clips (assembly_id, pos, filename, start, end, duration) VALUES (?, ?, ?, ?, ?, ?)",
-                (asm.id, clip.pos, clip.filename, clip.start, clip.end, clip.duration),
+
+
+async def _next_assembly_number(db) -> int:
+    cursor = await db.execute("SELECT id FROM assemblies ORDER BY created DESC, id DESC LIMIT 1")
+    row = await cursor.fetchone()
+    return int(row["id"].split("_")[1]) + 1 if row else 1
+
+
+@timed_query
+async def save_assembly(asm: Assembly) -> None:
+    async with pool.writer() as db:
+        await _write_assembly(db, asm)
+
+
+async def _write_assembly(db, asm: Assembly) -> None:
+    await db.execute(
+        """INSERT OR REPLACE INTO assemblies (id, name, status, error, preview, engine, release_mode, profile,
+                                             output_url, stream_url, signature, duration, note, created,
+                                             progress, fps, speed, eta)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (asm.id, asm.name, asm.status, asm.error, int(asm.preview), asm.engine, asm.release_mode, asm.profile,
+         asm.output_url, asm.stream_url, asm.signature, asm.duration, asm.note, asm.created, asm.progress,
+         asm.fps, asm.speed, asm.eta),
+    )
+    await db.execute("DELETE FROM clips WHERE assembly_id = ?", (asm.id,))
+    await db.executemany(
+        "INSERT INTO clips (assembly_id, pos, filename, start, end, duration) VALUES (?, ?, ?, ?, ?, ?)",
+        [(asm.id, clip.pos, clip.filename, clip.start, clip.end, clip.duration) for clip in asm.clips],
+    )
+
+
+@timed_query
+async def finish_assembly(asm: Assembly, worker: str | None = None) -> bool:
+    """Record a render's outcome and, for ``worker``, drop its job.
+
+    Only updates: an assembly deleted meanwhile stays deleted. With ``worker``, nothing is
+    written unless that worker still holds the job, so a render that was deleted or handed
+    to another worker can't overwrite it. Returns whether the outcome was recorded.
+    """
+    async with pool.writer() as db:
+        if worker is not None:
+            cursor = await db.execute(
+                "DELETE FROM jobs WHERE assembly_id = ? AND worker = ? AND state = 'running'", (asm.id, worker)
             )
-        await db.commit()
-    finally:
-        await db.close()
+            if cursor.rowcount == 0:
+                return False
+        cursor = await db.execute(
+            """UPDATE assemblies SET status = ?, error = ?, output_url = ?, stream_url = ?, duration = ?,
+                                     progress = ?, fps = ?, speed = ?, eta = ?
+               WHERE id = ?""",
+            (asm.status, asm.error, asm.output_url, asm.stream_url, asm.duration, asm.progress, asm.fps,
+             asm.speed, asm.eta, asm.id),
+        )
+        return cursor.rowcount > 0
 
 
+@timed_query
 async def get_assembly(assembly_id: str) -> Assembly | None:
-    db = await get_db()
-    try:
+    async with pool.reader() as db:
         cursor = await db.execute("SELECT * FROM assemblies WHERE id = ?", (assembly_id,))
         row = await cursor.fetchone()
         if not row:
             return None
         clips = await _fetch_clips(db, assembly_id)
-        return Assembly(
-            id=row["id"], name=row["name"], status=row["status"], error=row["error"],
-            preview=bool(row["preview"]), output_url=row["output_url"],
-            duration=row["duration"], note=row["note"], created=row["created"], clips=clips,
-        )
-    finally:
-        await db.close()
+        return _to_assembly(row, clips)
 
 
+@timed_query
 async def delete_assembly(assembly_id: str) -> bool:
-    db = await get_db()
-    try:
+    async with pool.writer() as db:
+        await db.execute("DELETE FROM jobs WHERE assembly_id = ?", (assembly_id,))
         await db.execute("DELETE FROM clips WHERE assembly_id = ?", (assembly_id,))
         cursor = await db.execute("DELETE FROM assemblies WHERE id = ?", (assembly_id,))
-        await db.commit()
         return cursor.rowcount > 0
-    finally:
-        await db.close()
 
 
+@timed_query
 async def update_assembly_note(assembly_id: str, note: str | None) -> bool:
-    db = await get_db()
-    try:
+    async with pool.writer() as db:
         cursor = await db.execute("UPDATE assemblies SET note = ? WHERE id = ?", (note, assembly_id))
-        await db.commit()
         return cursor.rowcount > 0
-    finally:
-        await db.close()
 
 
-async def list_assemblies() -> list[Assembly]:
-    db = await get_db()
-    try:
-        cursor = await db.execute("SELECT * FROM assemblies ORDER BY created DESC")
+@timed_query
+async def set_assembly_status(assembly_id: str, status: str) -> bool:
+    async with pool.writer() as db:
+        cursor = await db.execute("UPDATE assemblies SET status = ? WHERE id = ?", (status, assembly_id))
+        return cursor.rowcount > 0
+
+
+@timed_query
+async def update_assembly_progress(asm: Assembly) -> None:
+    async with pool.writer() as db:
+        await db.execute(
+            "UPDATE assemblies SET progress = ?, fps = ?, speed = ?, eta = ?, stream_url = ? WHERE id = ?",
+            (asm.progress, asm.fps, asm.speed, asm.eta, asm.stream_url, asm.id),
+        )
+
+
+@timed_query
+async def list_assemblies(
+    limit: int | None = None,
+    before: tuple[str, str] | None = None,
+    status: str | None = None,
+    preview: bool | None = None,
+    include_clips: bool = True,
+) -> list[Assembly]:
+    """Newest first. ``before`` is the (created, id) of the last assembly of the previous page."""
+    where, params = [], []
+    if before is not None:
+        where.append("(created, id) < (?, ?)")
+        params.extend(before)
+    if status is not None:
+        where.append("status = ?")
+        params.append(status)
+    if preview is not None:
+        where.append("preview = ?")
+        params.append(int(preview))
+    sql = "SELECT * FROM assemblies"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    async with pool.reader() as db:
+        cursor = await db.execute(sql, params)
         rows = await cursor.fetchall()
-        result = []
-        for row in rows:
-            clips = await _fetch_clips(db, row["id"])
-            result.append(Assembly(
-                id=row["id"], name=row["name"], status=row["status"], error=row["error"],
-                preview=bool(row["preview"]), output_url=row["output_url"],
-                duration=row["duration"], note=row["note"], created=row["created"], clips=clips,
-            ))
-        return result
-    finally:
-        await db.close()
+        clips = await _fetch_clips_many(db, [r["id"] for r in rows]) if include_clips else {}
+        return [_to_assembly(row, clips.get(row["id"], [])) for row in rows]
+
+
+@timed_query
+async def count_assemblies() -> dict[str, int]:
+    async with pool.reader() as db:
+        cursor = await db.execute("SELECT status, COUNT(*) AS n FROM assemblies GROUP BY status")
+        return {r["status"]: r["n"] for r in await cursor.fetchall()}
+
+
+@timed_query
+async def assembly_ids() -> set[str]:
+    async with pool.reader() as db:
+        cursor = await db.execute("SELECT id FROM assemblies")
+        return {r["id"] for r in await cursor.fetchall()}
+
+
+@timed_query
+async def finished_previews(created_before: str | None = None) -> list[str]:
+    """Ids of done or failed previews, oldest first."""
+    sql = "SELECT id FROM assemblies WHERE preview = 1 AND status IN ('done', 'failed')"
+    params = []
+    if created_before is not None:
+        sql += " AND created < ?"
+        params.append(created_before)
+    async with pool.reader() as db:
+        cursor = await db.execute(sql + " ORDER BY created, id", params)
+        return [r["id"] for r in await cursor.fetchall()]
+
+
+@timed_query
+async def queue_assemblies(asms: list[Assembly], priorities: list[int]) -> None:
+    """Number new assemblies and save them with their jobs in one transaction.
+
+    Ids are allocated under the writer, so concurrent submissions can't hand out the same one,
+    and no worker ever sees an assembly without its job.
+    """
+    async with pool.writer() as db:
+        number = await _next_assembly_number(db)
+        for asm, priority in zip(asms, priorities):
+            asm.id = f"asm_{number:03d}"
+            number += 1
+            await _write_assembly(db, asm)
+            await db.execute(
+                "INSERT OR REPLACE INTO jobs (assembly_id, priority, state, enqueued) VALUES (?, ?, 'queued', ?)",
+                (asm.id, priority, time.time()),
+            )
+
+
+@timed_query
+async def assemblies_by_signature(signatures: list[str]) -> dict[str, Assembly]:
+    """Newest done, queued or processing assembly for each signature that has one."""
+    if not signatures:
+        return {}
+    placeholders = ",".join("?" for _ in signatures)
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            f"""SELECT * FROM assemblies
+                WHERE signature IN ({placeholders}) AND status IN ('done', 'queued', 'processing')
+                ORDER BY created, id""",
+            signatures,
+        )
+        rows = {r["signature"]: r for r in await cursor.fetchall()}
+        clips = await _fetch_clips_many(db, [r["id"] for r in rows.values()])
+        return {sig: _to_assembly(r, clips.get(r["id"], [])) for sig, r in rows.items()}
 
 
+@timed_query
+async def has_queued_jobs() -> bool:
+    async with pool.reader() as db:
+        cursor = await db.execute("SELECT 1 FROM jobs WHERE state = 'queued' LIMIT 1")
+        return await cursor.fetchone() is not None
+
+
+@timed_query
+async def claim_job(worker: str) -> str | None:
+    """Atomically move the highest-priority queued job to running and return its assembly id."""
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            """UPDATE jobs SET state = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1
+               WHERE assembly_id = (
+                   SELECT assembly_id FROM jobs WHERE state = 'queued' ORDER BY priority DESC, enqueued LIMIT 1
+               )
+               RETURNING assembly_id""",
+            (worker, time.time()),
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
+        return row["assembly_id"] if row else None
+
+
+@timed_query
+async def finish_job(assembly_id: str) -> None:
+    async with pool.writer() as db:
+        await db.execute("DELETE FROM jobs WHERE assembly_id = ?", (assembly_id,))
+
+
+@timed_query
+async def heartbeat_jobs(worker: str, assembly_ids: list[str]) -> set[str]:
+    """Refresh the heartbeat of running jobs; returns the ids still owned by ``worker``."""
+    if not assembly_ids:
+        return set()
+    placeholders = ",".join("?" for _ in assembly_ids)
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            f"UPDATE jobs SET heartbeat = ? WHERE worker = ? AND state = 'running' "
+            f"AND assembly_id IN ({placeholders}) RETURNING assembly_id",
+            (time.time(), worker, *assembly_ids),
+        )
+        return {r["assembly_id"] for r in await cursor.fetchall()}
+
+
+@timed_query
+async def release_jobs(worker: str) -> None:
+    """Hand a stopping worker's running jobs back to the queue without charging an attempt."""
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            "UPDATE jobs SET state = 'queued', worker = NULL, attempts = attempts - 1 "
+            "WHERE worker = ? AND state = 'running' RETURNING assembly_id",
+            (worker,),
+        )
+        released = [(r["assembly_id"],) for r in await cursor.fetchall()]
+        await db.executemany("UPDATE assemblies SET status = 'queued' WHERE id = ?", released)
+
+
+@timed_query
+async def recover_jobs(
+    max_attempts: int, stale_before: float, worker: str | None = None,
+) -> tuple[list[str], list[str]]:
+    """Re-queue running jobs whose worker died, failing those out of attempts.
+
+    A job counts as orphaned when its heartbeat is older than ``stale_before`` or
+    it belongs to ``worker`` (a previous incarnation of the calling process).
+    Returns (requeued, failed) assembly ids.
+    """
+    orphaned = "state = 'running' AND (COALESCE(heartbeat, 0) < ? OR worker = ?)"
+    async with pool.writer() as db:
+        cursor = await db.execute(
+            f"UPDATE jobs SET state = 'queued', worker = NULL WHERE {orphaned} AND attempts < ? RETURNING assembly_id",
+            (stale_before, worker, max_attempts),
+        )
+        requeued = [r["assembly_id"] for r in await cursor.fetchall()]
+        await db.execute(f"DELETE FROM jobs WHERE {orphaned}", (stale_before, worker))
+        await db.executemany("UPDATE assemblies SET status = 'queued' WHERE id = ?", [(i,) for i in requeued])
+        # Also catches assemblies orphaned before the job queue existed
+        cursor = await db.execute(
+            "UPDATE assemblies SET status = 'failed', error = 'Interrupted: render worker stopped responding' "
+            "WHERE status IN ('queued', 'processing') AND id NOT IN (SELECT assembly_id FROM jobs) RETURNING id"
+        )
+        failed = [r["id"] for r in await cursor.fetchall()]
+        return requeued, failed
+
+
+@timed_query
+async def changed_assemblies(since: float) -> list[dict]:
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            """SELECT id, status, progress, fps, speed, eta, stream_url, updated FROM assemblies
+               WHERE updated > ? ORDER BY updated""",
+            (since,),
+        )
+        return [dict(r) for r in await cursor.fetchall()]
+
+
+@timed_query
 async def list_tags() -> list[Tag]:
-    db = await get_db()
-    try:
+    async with pool.reader() as db:
         cursor = await db.execute("SELECT id, name, color FROM tags ORDER BY name")
         rows = await cursor.fetchall()
         return [Tag(id=r["id"], name=r["name"], color=r["color"]) for r in rows]
-    finally:
-        await db.close()
 
 
+@timed_query
 async def create_tag(name: str, color: str = "#839496") -> Tag | None:
-    db = await get_db()
-    try:
+    async with pool.writer() as db:
         try:
             cursor = await db.execute("INSERT INTO tags (name, color) VALUES (?, ?)", (name, color))
-            await db.commit()
             return Tag(id=cursor.lastrowid, name=name, color=color)
         except Exception:
             return None
-    finally:
-        await db.close()
 
 
+@timed_query
 async def rename_tag(tag_id: int, name: str) -> Tag | None:
-    db = await get_db()
-    try:
+    async with pool.writer() as db:
         cursor = await db.execute("UPDATE tags SET name = ? WHERE id = ?", (name, tag_id))
-        await db.commit()
         if cursor.rowcount == 0:
             return None
         cur2 = await db.execute("SELECT color FROM tags WHERE id = ?", (tag_id,))
         row = await cur2.fetchone()
         return Tag(id=tag_id, name=name, color=row["color"])
-    finally:
-        await db.close()
 
 
+@timed_query
 async def delete_tag(tag_id: int) -> bool:
-    db = await get_db()
-    try:
-        await db.execute("PRAGMA foreign_keys = ON")
+    async with pool.writer() as db:
+        await db.execute("DELETE FROM source_tags WHERE tag_id = ?", (tag_id,))
         cursor = await db.execute("DELETE FROM tags WHERE id = ?", (tag_id,))
-        await db.commit()
         return cursor.rowcount > 0
-    finally:
-        await db.close()
 
 
+@timed_query
 async def set_source_tags(filename: str, tag_ids: list[int]) -> None:
-    db = await get_db()
-    try:
+    async with pool.writer() as db:
         await db.execute("DELETE FROM source_tags WHERE filename = ?", (filename,))
-        for tid in tag_ids:
-            await db.execute("INSERT INTO source_tags (filename, tag_id) VALUES (?, ?)", (filename, tid))
-        await db.commit()
-    finally:
-        await db.close()
+        await db.executemany(
+            "INSERT INTO source_tags (filename, tag_id) VALUES (?, ?)", [(filename, tid) for tid in tag_ids]
+        )
 
 
 async def _fetch_clips(db, assembly_id: str) -> list[ClipDetail]:
@@ -212,3 +439,30 @@ async def _fetch_clips(db, assembly_id: str) -> list[ClipDetail]:
     rows = await cursor.fetchall()
     return [ClipDetail(pos=r["pos"], filename=r["filename"], start=r["start"], end=r["end"], duration=r["duration"])
             for r in rows]
+
+
+async def _fetch_clips_many(db, assembly_ids: list[str]) -> dict[str, list[ClipDetail]]:
+    if not assembly_ids:
+        return {}
+    placeholders = ",".join("?" for _ in assembly_ids)
+    cursor = await db.execute(
+        f"SELECT assembly_id, pos, filename, start, end, duration FROM clips WHERE assembly_id IN ({placeholders}) "
+        "ORDER BY assembly_id, pos",
+        assembly_ids,
+    )
+    result: dict[str, list[ClipDetail]] = {}
+    for r in await cursor.fetchall():
+        result.setdefault(r["assembly_id"], []).append(
+            ClipDetail(pos=r["pos"], filename=r["filename"], start=r["start"], end=r["end"], duration=r["duration"])
+        )
+    return result
+
+
+def _to_assembly(row, clips: list[ClipDetail]) -> Assembly:
+    return Assembly(
+        id=row["id"], name=row["name"], status=row["status"], error=row["error"],
+        preview=bool(row["preview"]), engine=row["engine"], release_mode=row["release_mode"],
+        profile=row["profile"], output_url=row["output_url"], stream_url=row["stream_url"],
+        signature=row["signature"], duration=row["duration"], note=row["note"], created=row["created"], clips=clips,
+        progress=row["progress"], fps=row["fps"], speed=row["speed"], eta=row["eta"],
+    )
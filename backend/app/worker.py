@@ -0,0 +1,56 @@
+"""Standalone render worker: ``python -m app.worker``.
+
+Claims assembly jobs from the shared database and renders them against the
+shared sources/ and media/ volumes. Run the API with EMBEDDED_WORKER=0 and as
+many of these as there are render nodes. With WORKER_METRICS_PORT set, the
+worker's ffmpeg and assembly metrics are served on it in Prometheus format.
+"""
+import asyncio
+import logging
+import signal
+
+from app import metrics
+from app.config import MEDIA_DIR, WORKER_METRICS_PORT
+from app.db import init_db, pool
+from app.services.scheduler import WORKER_ID, scheduler
+
+logger = logging.getLogger(__name__)
+
+
+async def serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answer any request with the metrics page; enough for a Prometheus scraper."""
+    try:
+        while (await reader.readline()).strip():
+            pass
+        body = metrics.render().encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def main() -> None:
+    MEDIA_DIR.mkdir(parents=True, exist_ok=True)
+    await init_db()
+    await pool.open()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await scheduler.start()
+    server = await asyncio.start_server(serve_metrics, port=WORKER_METRICS_PORT) if WORKER_METRICS_PORT else None
+    logger.info("Render worker %s started", WORKER_ID)
+    await stop.wait()
+    if server:
+        server.close()
+    await scheduler.stop()
+    await pool.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""Compare the segments and filtergraph preview engines on synthetic sources.
+
+    uv run python -m bench.engines --clips 40 --clip-length 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app import state
+from app.db import init_db, pool
+from app.models.assembly import Assembly, ClipDetail
+from app.services.assembly import run_assembly
+from bench.synth import make_sources
+
+ENGINES = ("segments", "filtergraph")
+
+
+def timeline(sources: list[Path], clips: int, clip_length: float, source_length: float) -> list[ClipDetail]:
+    result = []
+    for i in range(clips):
+        start = round((i * 1.3) % max(0.1, source_length - clip_length), 2)
+        result.append(ClipDetail(
+            pos=i + 1, filename=sources[i % len(sources)].name,
+            start=start, end=start + clip_length, duration=clip_length,
+        ))
+    return result
+
+
+async def run(args: argparse.Namespace) -> dict:
+    sources = await make_sources(Path("sources"), args.sources, args.source_length, size=args.size)
+    await init_db()
+    await pool.open()
+    try:
+        clips = timeline(sources, args.clips, args.clip_length, args.source_length)
+        results = {}
+        for engine in ENGINES:
+            asm = Assembly(
+                id=f"bench_{engine}", preview=True, engine=engine, clips=clips, status="processing",
+                created=datetime.now(timezone.utc).isoformat(),
+            )
+            await state.save_assembly(asm)
+            t0 = time.perf_counter()
+            await run_assembly(asm)
+            results[engine] = {
+                "status": asm.status,
+                "error": asm.error,
+                "wall_s": round(time.perf_counter() - t0, 3),
+                "output_duration": asm.duration,
+            }
+        return {"clips": args.clips, "clip_length": args.clip_length, "size": args.size, "engines": results}
+    finally:
+        await pool.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", type=int, default=20)
+    parser.add_argument("--clip-length", type=float, default=2.0)
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument("--source-length", type=float, default=30.0)
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="kalinsky-bench-"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        print(json.dumps(asyncio.run(run(args)), indent=2))
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
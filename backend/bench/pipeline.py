@@ -0,0 +1,166 @@
+"""End-to-end pipeline benchmark on synthetic sources, written as a diffable JSON report.
+
+Each stage records wall and CPU time (ours and ffmpeg's), peak RSS, bytes written
+under media/ and how many ffmpeg/ffprobe processes it started.
+
+    uv run python -m bench.pipeline --clips 5 --clips 20 --output report.json
+    uv run python -m bench.pipeline --source 1920x1080:libx264:250:60 --source 640x360:libx265:25:20
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app import state
+from app.config import MEDIA_DIR, SEGMENT_CACHE_DIR, SOURCES_DIR
+from app.db import init_db, pool
+from app.models.assembly import Assembly
+from app.services.assembly import run_assembly
+from app.services.indexer import reindex_sources
+from app.services.proxies import wait_for_proxies
+from bench.engines import timeline
+from bench.synth import make_source
+
+# size:codec:gop:duration
+DEFAULT_SOURCES = ["1280x720:libx264:50:30", "1920x1080:libx264:250:30", "1280x720:libx265:100:30"]
+RUNS = [
+    {"name": "preview-segments", "preview": True, "engine": "segments"},
+    {"name": "preview-filtergraph", "preview": True, "engine": "filtergraph"},
+    {"name": "release-copy", "preview": False, "release_mode": "copy"},
+    {"name": "release-smart", "preview": False, "release_mode": "smart"},
+]
+
+_spawned: Counter = Counter()
+_create_subprocess_exec = asyncio.create_subprocess_exec
+
+
+async def _counting_exec(program, *args, **kwargs):
+    _spawned[Path(program).name] += 1
+    return await _create_subprocess_exec(program, *args, **kwargs)
+
+
+def _bytes_under(path: Path) -> int:
+    # Cached segments are hard-linked into assembly dirs; count each inode once
+    sizes = {}
+    for f in path.rglob("*"):
+        if f.is_file():
+            st = f.stat()
+            sizes[st.st_ino] = st.st_size
+    return sum(sizes.values())
+
+
+@asynccontextmanager
+async def measure(report: dict, stage: str):
+    spawned = _spawned.copy()
+    written = _bytes_under(MEDIA_DIR)
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    t0 = time.perf_counter()
+    yield
+    wall = time.perf_counter() - t0
+    own2, children2 = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    report[stage] = {
+        "wall_s": round(wall, 3),
+        "cpu_s": round(own2.ru_utime + own2.ru_stime - own.ru_utime - own.ru_stime, 3),
+        "ffmpeg_cpu_s": round(
+            children2.ru_utime + children2.ru_stime - children.ru_utime - children.ru_stime, 3
+        ),
+        # ru_maxrss is a high-water mark (KiB on Linux), so these only grow across stages
+        "peak_rss_kb": own2.ru_maxrss,
+        "ffmpeg_peak_rss_kb": children2.ru_maxrss,
+        "bytes_written": _bytes_under(MEDIA_DIR) - written,
+        "processes": dict(_spawned - spawned),
+    }
+
+
+def parse_source(spec: str) -> dict:
+    size, codec, gop, duration = spec.split(":")
+    return {"size": size, "codec": codec, "gop": int(gop), "duration": float(duration)}
+
+
+async def run(args: argparse.Namespace) -> dict:
+    specs = [parse_source(s) for s in args.source or DEFAULT_SOURCES]
+    stages: dict = {}
+    report = {
+        "started": datetime.now(timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "machine": platform.machine()},
+        "sources": specs,
+        "clip_length": args.clip_length,
+        "stages": stages,
+    }
+
+    async with measure(stages, "synth"):
+        sources = [
+            await make_source(SOURCES_DIR / f"synth_{i:02d}.mp4", s["duration"], size=s["size"], codec=s["codec"],
+                              gop=s["gop"], frequency=220 + 110 * i)
+            for i, s in enumerate(specs)
+        ]
+
+    await init_db()
+    await pool.open()
+    try:
+        async with measure(stages, "reindex-cold"):
+            await reindex_sources()
+        # Reindex starts proxy builds in the background; let them finish so no later stage competes with them
+        async with measure(stages, "proxies"):
+            await wait_for_proxies()
+        async with measure(stages, "reindex-warm"):
+            await reindex_sources()
+
+        source_length = min(s["duration"] for s in specs)
+        for clips in args.clips:
+            for spec in RUNS:
+                name, params = spec["name"], {k: v for k, v in spec.items() if k != "name"}
+                asm = Assembly(
+                    id=f"bench_{name}_{clips}", status="processing",
+                    clips=timeline(sources, clips, args.clip_length, source_length),
+                    created=datetime.now(timezone.utc).isoformat(), **params,
+                )
+                await state.save_assembly(asm)
+                # Timelines of different lengths share their first clips; start cold so every stage encodes
+                shutil.rmtree(SEGMENT_CACHE_DIR, ignore_errors=True)
+                async with measure(stages, f"{name}-{clips}"):
+                    await run_assembly(asm)
+                stages[f"{name}-{clips}"].update(status=asm.status, error=asm.error, output_duration=asm.duration)
+        return report
+    finally:
+        await pool.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", action="append", help="size:codec:gop:duration, repeatable")
+    parser.add_argument("--clips", type=int, action="append", help="clip count per assembly, repeatable")
+    parser.add_argument("--clip-length", type=float, default=2.0)
+    parser.add_argument("--output", type=Path, help="also write the report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+    args.clips = args.clips or [10]
+    output = args.output.resolve() if args.output else None
+
+    workdir = Path(tempfile.mkdtemp(prefix="kalinsky-bench-"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    asyncio.create_subprocess_exec = _counting_exec
+    try:
+        report = json.dumps(asyncio.run(run(args)), indent=2, sort_keys=True)
+        print(report)
+        if output:
+            output.write_text(report + "\n")
+    finally:
+        asyncio.create_subprocess_exec = _create_subprocess_exec
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Encode a synthetic clip with every encoder profile and report frames/sec.
+
+    uv run python -m bench.profiles --length 20 --size 1920x1080 --parallel 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from app.config import ENCODER_PROFILES, FFMPEG_THREADS
+from app.services.cutter import cut_segment
+from bench.synth import make_source
+
+RATE = 25
+
+
+async def encode(profile: str, source: Path, length: float, parallel: int) -> dict:
+    """Cut ``parallel`` copies of the clip at once, the way one assembly's segments contend for cores."""
+    t0 = time.perf_counter()
+    await asyncio.gather(*(
+        cut_segment(
+            filename=source.name, start=0, end=length, output_path=Path(f"{profile}_{i}.ts"),
+            preview=True, pos=i + 1, profile=profile,
+        )
+        for i in range(parallel)
+    ))
+    wall = time.perf_counter() - t0
+    return {
+        "wall_s": round(wall, 3),
+        "frames_per_s": round(length * RATE * parallel / wall, 1),
+        "bytes": sum(Path(f"{profile}_{i}.ts").stat().st_size for i in range(parallel)),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    source = await make_source(Path("sources") / "synth.mp4", args.length, size=args.size, rate=RATE)
+    profiles = args.profile or list(ENCODER_PROFILES)
+    results = {profile: await encode(profile, source, args.length, args.parallel) for profile in profiles}
+    return {
+        "size": args.size, "length": args.length, "parallel": args.parallel, "threads": FFMPEG_THREADS,
+        "profiles": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--length", type=float, default=10.0)
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--parallel", type=int, default=1, help="clips encoded at the same time")
+    parser.add_argument("--profile", action="append", choices=list(ENCODER_PROFILES), help="repeatable; default all")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="kalinsky-bench-"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        print(json.dumps(asyncio.run(run(args)), indent=2))
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Synthetic test sources generated with FFmpeg's lavfi devices."""
+from pathlib import Path
+
+from app.config import FFMPEG_BIN
+from app.services.ffmpeg import run_ffmpeg
+
+
+async def make_source(
+    path: Path,
+    duration: float,
+    size: str = "1280x720",
+    rate: int = 25,
+    codec: str = "libx264",
+    gop: int = 50,
+    frequency: int = 440,
+) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        FFMPEG_BIN, "-nostdin", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={rate}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency={frequency}:duration={duration}",
+        "-c:v", codec, "-g", str(gop), "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "128k",
+        "-shortest",
+        str(path),
+    ]
+    await run_ffmpeg(cmd, "synth")
+    return path
+
+
+async def make_sources(directory: Path, count: int, duration: float, **kwargs) -> list[Path]:
+    return [
+        await make_source(directory / f"synth_{i:03d}.mp4", duration, frequency=220 + 110 * i, **kwargs)
+        for i in range(count)
+    ]
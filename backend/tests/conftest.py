@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A scratch cwd, since sources/ and media/ are resolved relative to it."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sources").mkdir()
+    (tmp_path / "media").mkdir()
+    return tmp_path
@@ -0,0 +1,24 @@
+"""Skip markers for tests that run the ffmpeg on PATH."""
+import shutil
+import subprocess
+from functools import cache
+
+import pytest
+
+from app.config import FFMPEG_BIN
+
+
+@cache
+def _ffmpeg_list(kind: str) -> frozenset[str]:
+    """Names in ``ffmpeg -filters`` or ``-encoders``."""
+    out = subprocess.run([FFMPEG_BIN, "-hide_banner", f"-{kind}"], capture_output=True, text=True).stdout
+    return frozenset(line.split()[1] for line in out.splitlines() if len(line.split()) > 1)
+
+
+def requires_ffmpeg(*, filters: tuple[str, ...] = (), encoders: tuple[str, ...] = ()) -> pytest.MarkDecorator:
+    """Skip unless ffmpeg is installed and built with these filters and encoders."""
+    if shutil.which(FFMPEG_BIN) is None:
+        return pytest.mark.skip(reason="ffmpeg not installed")
+    missing = [name for name in filters if name not in _ffmpeg_list("filters")]
+    missing += [name for name in encoders if name not in _ffmpeg_list("encoders")]
+    return pytest.mark.skipif(bool(missing), reason=f"ffmpeg without {', '.join(missing)}")
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.config import FFMPEG_BIN
+from app.models.assembly import Assembly, ClipDetail
+from app.services.ffmpeg import run_ffmpeg
+from app.services.filtergraph import build_filtergraph_command, clip_input, render_filtergraph
+from app.services.probe import ffprobe
+from bench.synth import make_source
+from tests.helpers import requires_ffmpeg
+
+
+def _assembly(*clips: tuple[str, float, float]) -> Assembly:
+    return Assembly(
+        id="asm_test", engine="filtergraph", created=datetime.now(timezone.utc).isoformat(),
+        clips=[
+            ClipDetail(pos=i, filename=f, start=start, end=end, duration=end - start)
+            for i, (f, start, end) in enumerate(clips, 1)
+        ],
+    )
+
+
+async def _make_silent_source(path, duration: float) -> None:
+    await run_ffmpeg([
+        FFMPEG_BIN, "-nostdin", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size=320x180:rate=25:duration={duration}",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p",
+        str(path),
+    ], "synth")
+
+
+def test_silent_input_gets_generated_audio(workdir):
+    asm = _assembly(("silent.mp4", 0, 2), ("loud.mp4", 1, 3))
+    cmd = build_filtergraph_command(asm, workdir / "out.mp4", silent={str(clip_input("silent.mp4", 720))})
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert "[0:a]" not in graph
+    assert "anullsrc" in graph.split(";")[1]
+    assert "[1:a]" in graph
+
+
+@requires_ffmpeg(filters=("drawtext", "anullsrc"), encoders=("libx264", "aac"))
+async def test_render_with_silent_source(workdir):
+    await _make_silent_source(workdir / "sources" / "silent.mp4", 3)
+    await make_source(workdir / "sources" / "loud.mp4", 3, size="320x180")
+    asm = _assembly(("silent.mp4", 0.5, 2.5), ("loud.mp4", 1, 2))
+    out = workdir / "out.mp4"
+
+    await render_filtergraph(asm, out)
+
+    data = await ffprobe(str(out))
+    assert {s["codec_type"] for s in data["streams"]} == {"video", "audio"}
+    assert float(data["format"]["duration"]) == pytest.approx(3.0, abs=0.1)
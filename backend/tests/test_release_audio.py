@@ -0,0 +1,71 @@
+from array import array
+
+import numpy as np
+import pytest
+
+from app.config import AUDIO_FADE_MS, FFMPEG_BIN
+from app.services import release_audio
+from app.services.ffmpeg import run_ffmpeg
+from app.services.packet_index import PacketIndex
+from app.services.probe import ffprobe, probe_packets
+from app.services.release_audio import AAC_FRAME, PRE_ROLL_FRAMES, _splice_plan, render_release_audio
+from bench.synth import make_source
+from tests.helpers import requires_ffmpeg
+
+RATE = 44100
+
+
+def _aac_index(seconds: float) -> PacketIndex:
+    # Packet boundaries of an ffmpeg AAC encode, priming packet included
+    times = array("d", (i * AAC_FRAME / RATE for i in range(-1, int(seconds * RATE) // AAC_FRAME)))
+    return PacketIndex(array("d"), array("q"), array("I"), times)
+
+
+def test_splice_plan_lines_windows_up_with_packets():
+    fade = AUDIO_FADE_MS / 1000
+    plan = _splice_plan(_aac_index(10), RATE, 1.3, 7.7, fade)
+    for key in ("head_end", "tail_start", "head_from", "tail_from"):
+        assert plan[key] % AAC_FRAME == 0
+    assert plan["head_from"] <= plan["start"] < plan["head_from"] + AAC_FRAME
+    assert plan["head_end"] - AAC_FRAME < plan["start"] + plan["fade"] <= plan["head_end"]
+    assert plan["tail_start"] <= plan["end"] - plan["fade"] < plan["tail_start"] + AAC_FRAME
+    assert plan["tail_from"] == plan["tail_start"] - PRE_ROLL_FRAMES * AAC_FRAME
+    # Too short to copy anything between the fades
+    assert _splice_plan(_aac_index(10), RATE, 1.3, 1.3 + 2 * fade, fade) is None
+
+
+async def _pcm(path) -> np.ndarray:
+    out = path.with_suffix(".f32")
+    await run_ffmpeg([FFMPEG_BIN, "-nostdin", "-y", "-i", str(path), "-ac", "1", "-f", "f32le", str(out)], "decode")
+    return np.fromfile(out, dtype="<f4")
+
+
+@requires_ffmpeg(encoders=("libx264", "aac"))
+async def test_splice_matches_full_encode(workdir, monkeypatch):
+    await make_source(workdir / "sources" / "src.mp4", 10, size="320x180")
+    data = await ffprobe(str(workdir / "sources" / "src.mp4"))
+    index = PacketIndex.from_packets(await probe_packets(str(workdir / "sources" / "src.mp4")))
+    if not index.audio or not any(s.get("sample_rate") for s in data["streams"]):
+        pytest.skip("ffprobe lists no audio packets")
+
+    async def packet_index(filename):
+        return index
+
+    monkeypatch.setattr(release_audio, "get_packet_index", packet_index)
+    start, end = 1.3, 7.7
+    outputs = {}
+    for mode in ("encode", "splice"):
+        monkeypatch.setattr(release_audio, "RELEASE_AUDIO", mode)
+        outputs[mode] = workdir / "media" / f"{mode}.m4a"
+        await render_release_audio("src.mp4", start, end, outputs[mode])
+
+    for path in outputs.values():
+        duration = float((await ffprobe(str(path)))["format"]["duration"])
+        assert duration == pytest.approx(end - start, abs=2 / RATE)
+    encoded, spliced = await _pcm(outputs["encode"]), await _pcm(outputs["splice"])
+    assert abs(len(spliced) - len(encoded)) < AAC_FRAME
+    # Between the fades, a window off by a packet or a seam that doesn't overlap-add is an error the size
+    # of the signal; the two modes otherwise differ by codec noise
+    fade = round(AUDIO_FADE_MS / 1000 * RATE)
+    n = min(len(spliced), len(encoded)) - fade
+    assert np.abs(spliced[fade:n] - encoded[fade:n]).max() < 0.1 * np.abs(encoded).max()
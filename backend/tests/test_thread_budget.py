@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.services.ffmpeg import ThreadBudget
+
+
+async def _burst(budget: ThreadBudget, count: int, threads: int = 0) -> tuple[list[int], int]:
+    """Run ``count`` encodes at once through the same slot/budget sequence as run_ffmpeg."""
+    slots = asyncio.Semaphore(budget.max_running)
+    grants: list[int] = []
+    peak = 0
+
+    async def encode(i: int) -> None:
+        nonlocal peak
+        with budget.wanted(threads):
+            async with slots:
+                async with budget.grant(threads) as granted:
+                    grants.append(granted)
+                    peak = max(peak, budget.in_use)
+                    await asyncio.sleep(0.001 * (1 + i % 3))
+
+    await asyncio.gather(*(encode(i) for i in range(count)))
+    return grants, peak
+
+
+async def test_burst_is_shared_evenly():
+    budget = ThreadBudget(total=16, max_running=16)
+    grants, peak = await _burst(budget, 40)
+    assert grants[:16] == [1] * 16
+    assert peak <= 16
+    assert budget.in_use == 0 and budget.demand == 0
+
+
+@pytest.mark.parametrize("total, max_running, count", [(16, 4, 10), (8, 8, 3), (4, 8, 20), (12, 5, 7)])
+async def test_grants_never_exceed_budget(total, max_running, count):
+    budget = ThreadBudget(total=total, max_running=max_running)
+    grants, peak = await _burst(budget, count)
+    assert peak <= total
+    assert len(grants) == count and min(grants) >= 1
+    assert grants[0] == max(1, total // min(max_running, count))
+
+
+async def test_waiting_encodes_are_resized_on_release():
+    budget = ThreadBudget(total=8, max_running=8)
+    release = asyncio.Event()
+
+    async def lone() -> int:
+        with budget.wanted(0):
+            async with budget.grant(0) as granted:
+                await release.wait()
+                return granted
+
+    first = asyncio.create_task(lone())
+    await asyncio.sleep(0.01)
+    later = asyncio.create_task(_burst(budget, 4))
+    await asyncio.sleep(0.01)
+    # Everything is taken, so the burst waits rather than oversubscribing
+    assert budget.in_use == 8 and not later.done()
+    release.set()
+    assert await first == 8
+    grants, peak = await later
+    assert grants == [2, 2, 2, 2] and peak <= 8
+
+
+async def test_thread_cap_and_lone_encode():
+    budget = ThreadBudget(total=16, max_running=4)
+    assert (await _burst(budget, 1))[0] == [16]
+    assert (await _burst(budget, 1, threads=2))[0] == [2]
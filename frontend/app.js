@@ -1,6 +1,7 @@
 const API = "/api/v1";
 let sources = [];
 let allAssemblies = [];
+let assembliesCursor = null;
 let selectedAsmId = null;
 let activeTab = "tries";
 let allTags = [];
@@ -107,11 +108,19 @@ async function reindex() {
     btn.textContent = "...";
     try {
         await api("POST", "/sources/reindex");
-        await loadSources();
+        await reloadSources();
     } catch (e) { alert(e.message); }
     btn.textContent = "Reindex";
 }
 
+// After a reindex: clip rows are remapped by loadSources, and the per-file caches are dropped once the
+// new indexes are in, so nothing is fetched again under an old one
+async function reloadSources() {
+    await loadSources();
+    for (const cache of [thumbInfo, waveforms]) Object.keys(cache).forEach(k => delete cache[k]);
+    document.querySelectorAll("#clips-list .clip-row").forEach(drawClipWave);
+}
+
 async function loadSources() {
     try {
         sources = await api("GET", "/sources");
@@ -136,7 +145,7 @@ function renderSources() {
             </div>
             <button class="tag-assign-btn" onclick="event.stopPropagation(); toggleTagAssign(this, ${s.index})" title="Tags">T</button>
             <button class="preview-btn" onclick="event.stopPropagation(); previewSource('${s.filename}')">Play</button>
-            <div class="source-thumb"><img src="${thumbUrl}" alt=""></div>
+            <div class="source-thumb"><img src="${thumbUrl}" alt=""><div class="thumb-tile"></div></div>
         </div>`;
     }).join("");
     el.querySelectorAll(".source-item").forEach(item => {
@@ -147,10 +156,50 @@ function renderSources() {
             thumb.style.left = rect.right + 4 + "px";
             thumb.style.top = rect.top + "px";
         });
+        item.addEventListener("mousemove", (e) => scrubThumb(item, thumb, e));
+        item.addEventListener("mouseleave", () => thumb.classList.remove("scrubbing"));
     });
+    remapClipSources();
     highlightUsedSources();
 }
 
+// Indexes follow the sorted file list and shift when files land, so clip rows hold on to the filename
+// and take their index from the current list
+function remapClipSources() {
+    document.querySelectorAll("#clips-list .clip-row").forEach(row => {
+        const src = sources.find(s => s.filename === row.dataset.filename);
+        row.dataset.source = src ? src.index : "";
+        row.querySelector(".clip-filename strong").textContent = src ? src.index : "?";
+    });
+}
+
+// Sprite sheet layout per source filename, fetched on first hover
+const thumbInfo = {};
+
+async function scrubThumb(item, thumb, e) {
+    const filename = item.dataset.filename;
+    if (!(filename in thumbInfo)) {
+        thumbInfo[filename] = null;
+        try {
+            thumbInfo[filename] = await api("GET", `/sources/${item.dataset.index}/thumbnails`);
+        } catch (err) { return; }
+    }
+    const info = thumbInfo[filename];
+    if (!info) return;
+    const rect = item.getBoundingClientRect();
+    const frac = Math.min(Math.max((e.clientX - rect.left) / rect.width, 0), 0.999);
+    const i = Math.floor(frac * info.count);
+    const perSheet = info.columns * info.rows;
+    const scale = 240 / info.width;
+    const tile = thumb.querySelector(".thumb-tile");
+    tile.style.height = info.height * scale + "px";
+    tile.style.backgroundImage = `url("${info.sprites[Math.floor(i / perSheet)]}")`;
+    tile.style.backgroundSize = `${info.columns * 240}px auto`;
+    tile.style.backgroundPosition = `-${(i % perSheet) % info.columns * 240}px -${Math.floor((i % perSheet) / info.columns) * info.height * scale}px`;
+    tile.dataset.time = fmt(i * info.interval);
+    thumb.classList.add("scrubbing");
+}
+
 function toggleTagAssign(btn, index) {
     // Close all existing dropdowns
     document.querySelectorAll(".tag-assign-dropdown").forEach(d => d.remove());
@@ -242,8 +291,9 @@ function addClip(sourceIndex, filename, duration, start, end) {
     const endVal = end != null ? `value="${end}"` : "";
     const placeholder = parseFloat(duration).toFixed(1);
     div.innerHTML = `
+        <canvas class="clip-wave"></canvas>
         <span class="clip-pos">${pos}.</span>
-        <span class="clip-filename" title="${filename}"><strong>${sourceIndex}</strong> ${filename}</span>
+        <span class="clip-filename" title="${filename}"><strong>${sourceIndex === "" ? "?" : sourceIndex}</strong> ${filename}</span>
         <input type="number" class="clip-start" placeholder="0" step="0.1" min="0" max="${duration}" ${startVal}>
         <input type="number" class="clip-end" placeholder="${placeholder}" step="0.1" min="0" max="${duration}" ${endVal}>
         <button type="button" class="move-btn" onclick="moveClip(this, -1)" title="Up">&#9650;</button>
@@ -251,9 +301,37 @@ function addClip(sourceIndex, filename, duration, start, end) {
         <button type="button" class="remove-btn" onclick="removeClip(this)">X</button>
     `;
     container.appendChild(div);
+    div.querySelectorAll("input").forEach(input => input.addEventListener("input", () => drawClipWave(div)));
+    drawClipWave(div);
     updateClipsUI();
 }
 
+// Waveform per source filename, fetched once and shared by every clip of that source
+const waveforms = {};
+
+async function drawClipWave(row) {
+    const filename = row.dataset.filename;
+    if (!row.dataset.source) return;
+    if (!(filename in waveforms)) {
+        waveforms[filename] = api("GET", `/sources/${row.dataset.source}/waveform?resolution=400`).catch(() => null);
+    }
+    const wf = await waveforms[filename];
+    const canvas = row.querySelector(".clip-wave");
+    if (!wf || !canvas.clientWidth) return;
+    const w = canvas.width = canvas.clientWidth;
+    const h = canvas.height = canvas.clientHeight;
+    const ctx = canvas.getContext("2d");
+    const start = parseFloat(row.querySelector(".clip-start").value) || 0;
+    const end = parseFloat(row.querySelector(".clip-end").value) || wf.duration;
+    const n = wf.peaks.length;
+    for (let i = 0; i < n; i++) {
+        const t = i * wf.duration / n;
+        const peak = Math.max(1, wf.peaks[i] * h);
+        ctx.fillStyle = t >= start && t < end ? "#268bd2" : "#93a1a1";
+        ctx.fillRect(i * w / n, (h - peak) / 2, Math.max(1, w / n), peak);
+    }
+}
+
 function addClipFromSource(item) {
     addClip(item.dataset.index, item.dataset.filename, item.dataset.duration, 0, item.dataset.duration);
 }
@@ -290,9 +368,9 @@ function updateClipsUI() {
 
 function highlightUsedSources() {
     const used = new Set();
-    document.querySelectorAll("#clips-list .clip-row").forEach(row => used.add(row.dataset.source));
+    document.querySelectorAll("#clips-list .clip-row").forEach(row => used.add(row.dataset.filename));
     document.querySelectorAll("#sources-list .source-item").forEach(item => {
-        item.classList.toggle("source-used", used.has(item.dataset.index));
+        item.classList.toggle("source-used", used.has(item.dataset.filename));
     });
 }
 
@@ -305,7 +383,7 @@ function fillFormFromAssembly(asm) {
         const duration = src ? src.duration : c.end;
         const start = c.start > 0 ? c.start : null;
         const end = (c.end < duration) ? c.end : null;
-        addClip(src ? src.index : 0, c.filename, duration, start, end);
+        addClip(src ? src.index : "", c.filename, duration, start, end);
     }
     updateClipsUI();
 }
@@ -317,6 +395,7 @@ function switchTab(tab) {
         b.classList.toggle("tab-active", b.dataset.tab === tab);
     });
     renderAssemblies();
+    loadAssemblies();
 }
 
 // Assemblies
@@ -325,7 +404,7 @@ async function createAssembly(e) {
     const rows = document.querySelectorAll("#clips-list .clip-row");
     if (!rows.length) { alert("Add at least one clip"); return; }
     const clips = Array.from(rows).map(row => {
-        const clip = { source: parseInt(row.dataset.source) };
+        const clip = { source: row.dataset.filename };
         const start = row.querySelector(".clip-start").value;
         const end = row.querySelector(".clip-end").value;
         if (start) clip.start = parseFloat(start);
@@ -339,13 +418,26 @@ async function createAssembly(e) {
         const asm = await api("POST", "/assemblies", body);
         await loadAssemblies();
         selectAssembly(asm.id);
-        startPolling();
     } catch (e) { alert(e.message); }
 }
 
+// One page of the active tab; the cursor for the next page comes back in X-Next-Cursor
+async function fetchAssembliesPage(cursor) {
+    let path = `/assemblies?preview=${activeTab === "tries"}&limit=50`;
+    if (cursor) path += `&before=${encodeURIComponent(cursor)}`;
+    const res = await fetch(API + path);
+    if (!res.ok) {
+        const err = await res.json().catch(() => ({ detail: res.statusText }));
+        throw new Error(err.detail || JSON.stringify(err));
+    }
+    return { items: await res.json(), next: res.headers.get("X-Next-Cursor") };
+}
+
 async function loadAssemblies() {
     try {
-        allAssemblies = await api("GET", "/assemblies");
+        const page = await fetchAssembliesPage(null);
+        allAssemblies = page.items;
+        assembliesCursor = page.next;
         renderAssemblies();
         return allAssemblies;
     } catch (e) {
@@ -354,10 +446,20 @@ async function loadAssemblies() {
     }
 }
 
+async function loadMoreAssemblies() {
+    if (!assembliesCursor) return;
+    try {
+        const page = await fetchAssembliesPage(assembliesCursor);
+        const known = new Set(allAssemblies.map(a => a.id));
+        allAssemblies.push(...page.items.filter(a => !known.has(a.id)));
+        assembliesCursor = page.next;
+        renderAssemblies();
+    } catch (e) { alert(e.message); }
+}
+
 function renderAssemblies() {
     const el = document.getElementById("assemblies-list");
-    const filtered = allAssemblies.filter(a => activeTab === "tries" ? a.preview : !a.preview);
-    const show = filtered.slice(0, 50);
+    const show = allAssemblies.filter(a => activeTab === "tries" ? a.preview : !a.preview);
     if (!show.length) { el.innerHTML = '<div class="empty" style="padding:8px">No assemblies yet</div>'; return; }
     el.innerHTML = show.map(a => {
         const sel = a.id === selectedAsmId ? " asm-selected" : "";
@@ -368,11 +470,13 @@ function renderAssemblies() {
             error = `<div class="asm-error">${a.error}</div>`;
         }
         const release = a.preview ? "" : " asm-release";
+        const p = a.status === "processing" && (assemblyProgress[a.id] || (a.progress != null && a));
+        const statusText = p ? progressText(p) : a.status;
         return `<div class="asm-item${sel}${release}" data-id="${a.id}">
             <div class="asm-header">
                 <strong>${a.id}</strong>
                 ${a.name ? " — " + a.name : ""}
-                <span class="status status-${a.status}">${a.status}</span>
+                <span class="status status-${a.status}">${statusText}</span>
                 ${fmt(a.duration)}
             </div>
             <div class="asm-clips">${clips}</div>
@@ -385,7 +489,9 @@ function renderAssemblies() {
             </div>
             ${error}
         </div>`;
-    }).join("");
+    }).join("") + (assembliesCursor
+        ? '<div class="asm-more"><a class="asm-link" onclick="loadMoreAssemblies()">load more</a></div>'
+        : "");
     el.querySelectorAll(".asm-item").forEach(item => {
         item.addEventListener("click", (e) => {
             if (e.target.tagName === "INPUT" || e.target.tagName === "BUTTON") return;
@@ -403,29 +509,67 @@ function selectAssembly(id) {
     renderPlayer(asm);
 }
 
+let hls = null;
+let playerKey = null;
+
+function canPlayStream() {
+    return !!document.createElement("video").canPlayType("application/vnd.apple.mpegurl")
+        || !!(window.Hls && Hls.isSupported());
+}
+
+function playStream(video, url) {
+    if (video.canPlayType("application/vnd.apple.mpegurl")) {
+        video.src = url;
+    } else {
+        hls = new Hls();
+        hls.loadSource(url);
+        hls.attachMedia(video);
+    }
+}
+
 function renderPlayer(asm) {
     const title = document.getElementById("player-title");
     const content = document.getElementById("player-content");
+    // Events re-render often; don't restart a video that is already playing the same thing
+    const key = asm ? `${asm.id}:${asm.status}:${asm.stream_url}` : null;
+    if (key === playerKey) return;
+    playerKey = key;
+    const previous = content.querySelector("video");
+    const resumeAt = previous && asm && previous.dataset.id === asm.id ? previous.currentTime : 0;
+    if (hls) {
+        hls.destroy();
+        hls = null;
+    }
     if (!asm) {
         title.textContent = "Player";
         content.innerHTML = '<div class="empty">Select an assembly from the feed</div>';
         return;
     }
     title.textContent = asm.id + (asm.name ? " — " + asm.name : "");
-    if (asm.status === "processing") {
+    if (asm.status === "queued") {
+        content.innerHTML = '<div class="empty">Queued...</div>';
+    } else if (asm.status === "processing" && asm.stream_url && canPlayStream()) {
+        content.innerHTML = `
+            <video controls autoplay data-id="${asm.id}"></video>
+            <div class="player-info">Streaming while rendering...</div>`;
+        playStream(content.querySelector("video"), asm.stream_url);
+    } else if (asm.status === "processing") {
         content.innerHTML = '<div class="empty">Processing...</div>';
     } else if (asm.status === "failed") {
         content.innerHTML = `<div class="empty">Failed: ${asm.error || "unknown error"}</div>`;
     } else if (asm.output_url) {
         const dlName = (asm.name || asm.id) + ".mp4";
         content.innerHTML = `
-            <video controls autoplay src="${asm.output_url}"></video>
+            <video controls autoplay data-id="${asm.id}" src="${asm.output_url}"></video>
             <div class="player-info">
                 ${fmt(asm.duration)} &middot; <a href="${asm.output_url}" download="${dlName}" target="_blank">Download</a>
             </div>`;
     } else {
         content.innerHTML = '<div class="empty">No output</div>';
     }
+    // Carry on from where the stream was when the finished file replaces it
+    const video = content.querySelector("video");
+    if (video && resumeAt) video.currentTime = resumeAt;
 }
 
 function fillFormById(id) {
@@ -457,21 +601,48 @@ function saveNote(input) {
     }, 300);
 }
 
-// Polling
-let pollTimer = null;
-function startPolling() {
-    if (pollTimer) return;
-    pollTimer = setInterval(async () => {
-        const assemblies = await loadAssemblies();
-        if (selectedAsmId) {
-            const asm = assemblies.find(a => a.id === selectedAsmId);
-            if (asm) renderPlayer(asm);
+// Live updates
+function progressText(p) {
+    const eta = p.eta != null ? ` · ${fmt(p.eta)} left` : "";
+    return `processing ${Math.round(p.progress)}%${eta}`;
+}
+
+let assemblyProgress = {};
+function connectEvents() {
+    const es = new EventSource(API + "/assemblies/events");
+    // Resync after (re)connecting — events sent while disconnected are lost
+    es.onopen = () => loadAssemblies();
+    es.addEventListener("assembly", (e) => {
+        const asm = JSON.parse(e.data);
+        if (asm.status !== "processing") delete assemblyProgress[asm.id];
+        if (asm.preview !== (activeTab === "tries")) return;
+        const i = allAssemblies.findIndex(a => a.id === asm.id);
+        if (i >= 0) allAssemblies[i] = asm;
+        else allAssemblies.unshift(asm);
+        renderAssemblies();
+        if (asm.id === selectedAsmId) renderPlayer(asm);
+    });
+    es.addEventListener("progress", (e) => {
+        const p = JSON.parse(e.data);
+        assemblyProgress[p.id] = p;
+        const asm = allAssemblies.find(a => a.id === p.id);
+        if (asm && p.stream_url && !asm.stream_url) {
+            asm.stream_url = p.stream_url;
+            if (asm.id === selectedAsmId) renderPlayer(asm);
         }
-        if (!assemblies.some(a => a.status === "processing")) {
-            clearInterval(pollTimer);
-            pollTimer = null;
+        const status = document.querySelector(`.asm-item[data-id="${p.id}"] .status`);
+        if (status) status.textContent = progressText(p);
+    });
+    es.addEventListener("sources", () => reloadSources());
+    es.addEventListener("deleted", (e) => {
+        const { id } = JSON.parse(e.data);
+        allAssemblies = allAssemblies.filter(a => a.id !== id);
+        renderAssemblies();
+        if (selectedAsmId === id) {
+            selectedAsmId = null;
+            renderPlayer(null);
         }
-    }, 2000);
+    });
 }
 
 // Init
@@ -480,4 +651,5 @@ document.getElementById("assembly-form").addEventListener("submit", createAssemb
 document.getElementById("new-tag-input").addEventListener("keydown", (e) => { if (e.key === "Enter") { e.preventDefault(); createTag(); } });
 loadTags();
 loadSources();
-loadAssemblies().then(a => { if (a.some(x => x.status === "processing")) startPolling(); });
+loadAssemblies();
+connectEvents();